@@ -47,10 +47,12 @@ DO_YOU_ACCEPT = "Yes"
 import re
 import requests
 import csv
+import itertools
 import os
 import logging
 import mimetypes
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 class GedcomFileInvalid(Exception):
     pass
@@ -61,11 +63,18 @@ class LoginError(Exception):
 class FileExistsError(Exception):
     pass
 
+# The header is the HEAD line and the lines below it, and must be found in the first HEAD_LIMIT characters of the file.
+HEAD_LIMIT = 1024 * 1024
+HEAD_REGEX = re.compile(r'[ \t]*0 HEAD\s*$')
+HEAD_LINE_REGEX = re.compile(r'[ \t]*(?!0)\d+ [A-Z_]+(?: .*)?$')
+HEAD_SOUR_REGEX = re.compile(r'[ \t]*1 SOUR (.*)$')
+
 def validate_gedcom_file(file_path, encoding="utf8"):
     """
-    Takes a file path to a gedcom file, and validates that file.
+    Takes a file path to a gedcom file, and validates that file from its header alone, so it doesn't matter how big
+    the file is.
 
-    Returns the file text.
+    Returns an iterator over the lines of the file, which reads the rest of it as it goes, and closes it at the end.
     """
 
     # Check we have a file path.
@@ -76,44 +85,135 @@ def validate_gedcom_file(file_path, encoding="utf8"):
     if not os.path.exists(file_path):
         raise GedcomFileInvalid('A file cannot be found at the provided path.')
 
-    # Read the file contents.
+    # Open the file, and read only its header.
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            file_text = f.read()
+        f = open(file_path, 'r', encoding=encoding)
     except Exception as e:
         raise GedcomFileInvalid('There was an error when reading the file: ' + str(e))
-
-    # Check we have a gedcom head section.
-    file_head = re.search('^([ \t]*0 HEAD\s+(?:^[ \t]*(?!0)\d+ [A-Z_]+(?: .*)?\s+)*)', file_text, re.MULTILINE)
-    if not file_head:
-        raise GedcomFileInvalid('The file cannot be verified as a gedcom file, as it does not have a header section.')
-    else:
-        file_head = file_head.group(0)
+    try:
+        head_lines = read_gedcom_head(f)
+    except GedcomFileInvalid:
+        f.close()
+        raise
 
     # Check the gedcom source is ancestry.
-    file_head_sour = re.search('^[ \t]*1 SOUR (.*)$', file_head, re.MULTILINE)
+    file_head_sour = None
+    for line in head_lines:
+        file_head_sour = HEAD_SOUR_REGEX.match(line.rstrip('\r\n'))
+        if file_head_sour:
+            break
     if not file_head_sour:
+        f.close()
         raise GedcomFileInvalid('The header of this gedcom file does not provide a source, so the file cannot be verirified from Ancestry.com.')
     elif file_head_sour.group(1) != 'Ancestry.com Family Trees':
+        f.close()
         raise GedcomFileInvalid('The header of this gedcom file indicates its source is not Ancestry.com, but {0}.'.format(file_head_sour.group(1)))
 
-    return file_text
+    return iter_gedcom_lines(f, head_lines)
 
-def process_gedcom_text(text):
+def read_gedcom_head(f):
     """
-    Extract all the app id's from the gedcom text.
+    Reads the header section from the start of an open gedcom file, reading no more than HEAD_LIMIT characters.
+
+    Returns the lines read, the last of which is the first line after the header, if there is one.
+    """
+
+    head_lines = []
+    found_head = False
+    remaining = HEAD_LIMIT
+
+    while remaining > 0:
+        try:
+            line = f.readline(remaining)
+        except Exception as e:
+            raise GedcomFileInvalid('There was an error when reading the file: ' + str(e))
+        if not line:
+            break
+        remaining = remaining - len(line)
+        head_lines.append(line)
+
+        # Blank lines are allowed anywhere in the header, and a byte order mark before it.
+        text = line.rstrip('\r\n').lstrip('\ufeff')
+        if not text.strip():
+            continue
+
+        # The first line must be the HEAD line, and the header ends at the first line that isn't below it.
+        if not found_head:
+            if not HEAD_REGEX.match(text):
+                break
+            found_head = True
+        elif not HEAD_LINE_REGEX.match(text):
+            break
+    else:
+        raise GedcomFileInvalid('The file cannot be verified as a gedcom file, as its header section is too long.')
+
+    # Check we have a gedcom head section.
+    if not found_head:
+        raise GedcomFileInvalid('The file cannot be verified as a gedcom file, as it does not have a header section.')
+
+    return head_lines
+
+def iter_gedcom_lines(f, head_lines):
+    """
+    Yields the lines already read from the header of an open gedcom file, then the rest of its lines as they are read.
+
+    Closes the file when the lines run out, or the iterator is closed.
+    """
+
+    with f:
+        yield from head_lines
+        try:
+            for line in f:
+                yield line
+        except (OSError, UnicodeError) as e:
+            raise GedcomFileInvalid('There was an error when reading the file: ' + str(e))
+
+# A line's level, a SOUR citation pointing at a source record, and an _APID line with its (indiv, dbid, pid) parts.
+LEVEL_REGEX = re.compile(r'[ \t]*(\d+)[ \t]')
+SOUR_REGEX = re.compile(r'[ \t]*(\d+) SOUR (@?[^\d\r\n]*\d+@?)\s*$')
+APID_REGEX = re.compile(r'[ \t]*\d+ _APID ((\d+),(\d+)::(\d+))')
 
-    Returns a tuple of ID's of the form (Source, APID, Indiv, DB, Record/Person)
+def iter_apid_matches(lines):
     """
+    Walk the lines of a gedcom file, such as an open file, one at a time, and find the app id's of each SOUR citation.
+    A citation is the SOUR line and the lines below it, up to the next line at the same or a higher level.
 
-    regex = re.compile(
-        r'^[ \t]*\d+ SOUR (@?[\D]*\d+@?)\s+(?:^[ \t]*\d+ (?!SOUR)[A-Z_]+(?: .*)?\s+)*^[ \t]*\d+ _APID ((\d+),(\d+)::(\d+))',
-        re.MULTILINE
-    )
+    Yields tuples of ID's of the form (Source, APID, Indiv, DB, Record/Person) as they are found.
+    """
+
+    sour = None
+    sour_level = 0
+
+    for line in lines:
+
+        # Only a citation's lines need their level checked, to know when it ends.
+        if sour is not None:
+            level = LEVEL_REGEX.match(line)
+            if level and int(level.group(1)) <= sour_level:
+                sour = None
+
+        # Start a new citation.
+        if 'SOUR' in line:
+            citation = SOUR_REGEX.match(line)
+            if citation:
+                sour_level = int(citation.group(1))
+                sour = citation.group(2)
+                continue
+
+        # Yield the app id's within the citation.
+        if sour is not None and '_APID' in line:
+            apid = APID_REGEX.match(line)
+            if apid:
+                yield (sour,) + apid.groups()
+
+def process_gedcom_text(text):
+    """
+    Extract all the app id's from the gedcom text.
 
-    matches = regex.findall(text)
+    Returns a list of tuples of ID's of the form (Source, APID, Indiv, DB, Record/Person)
+    """
 
-    return matches
+    return list(iter_apid_matches(text.splitlines()))
 
 def start_session(username, password):
     """
@@ -191,19 +291,173 @@ def setup_output(path, file_name='output'):
 
     return (csv_file, csv_writer, logger)
 
-def process_apids(apid_matches, *, session, csv_writer, logger):
+# How many requests of each stage are made at once, and how many APID's can wait for, or in, each stage.
+RECORD_PAGE_WORKERS = 4
+MEDIA_INFO_WORKERS = 4
+DOWNLOAD_WORKERS = 4
+QUEUE_SIZE = 32
+
+IID_REGEX = re.compile(r"var iid='([^\s']+)';")
+
+class apid_job(object):
+    """
+    An APID going through the stages of `process_apids()`, with the log messages it has for when it is finished.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.previous = False
+        self.messages = []
+        self.future = None
+        self.problem = False
+        self.iid = None
+        self.image = None
+        self.write = False
+
+    def info(self, message):
+        self.messages.append((logging.INFO, message))
+
+    def error(self, message):
+        self.messages.append((logging.ERROR, message))
+
+    def result(self):
+        """
+        Wait for the stage the APID is in, and any stage it was passed on to.
+
+        Returns what the last stage returned.
+        """
+
+        result = self.future.result() if self.future else None
+        if isinstance(result, Future):
+            result = result.result()
+        return result
+
+    def done(self):
+        if self.future is None:
+            return True
+        if not self.future.done():
+            return False
+        if self.future.exception() is None and isinstance(self.future.result(), Future):
+            return self.future.result().done()
+        return True
+
+def get_record_page(session, job):
+    """
+    Visit the record page of an APID, and extract the image id associated with the record.
+    """
+
+    fields = job.fields
+
+    # Visit the record page corresponding to the app id.
+    job.info("    > Getting the record page for the APID...")
+    record_page = session.get('http://search.ancestry.com/cgi-bin/sse.dll?indiv={0}&dbid={1}&h={2}'.format(fields['indiv'], fields['dbid'], fields['pid']))
+    if record_page.status_code != 200:
+        job.error("    > There was an error when trying to get the record page for the APID.")
+        job.problem = True
+        job.info("    > Aborted!")
+        return
+
+    # Extract the image id associated with the record from the returned html.
+    job.info("    > Processing the record page to determine the image ID...")
+    match = IID_REGEX.search(record_page.text)
+    if match:
+        job.iid = match.group(1)
+
+def get_media_info(session, job, download_pool):
+    """
+    Get the api data related to the image of an APID, and pass its download url on to the download stage.
+
+    Returns the future of the download, or None if there was a problem.
+    """
+
+    fields = job.fields
+
+    # Get the api data related to the image.
+    job.info("    > Get information regarding the image...")
+    image_page = session.get('http://interactive.ancestry.com/api/v2/Media/GetMediaInfo/{0}/{1}/{2}'.format(fields['dbid'], job.iid, fields['pid']))
+    if image_page.status_code != 200:
+        job.error("    > There was an error when trying to get the image info.")
+        job.problem = True
+        job.info("    > Aborted!")
+        return None
+
+    # Extract the download url for the returned json.
+    job.info("    > Processing the image information...")
+    image_page_json = image_page.json()
+    try:
+        download_url = image_page_json['ImageServiceUrlForDownload']
+    except KeyError:
+        job.error("    > There was an error when trying to get the download URL from the image info.")
+        job.problem = True
+        job.info("    > Aborted!")
+        return None
+
+    return download_pool.submit(download_image, session, job, download_url)
+
+def download_image(session, job, download_url):
+    """
+    Download the image of an APID, and save it into a folder for its dbid.
+
+    Returns a tuple of (extension, saved), where the extension is None if the image could not be downloaded.
+    """
+
+    dbid = job.fields['dbid']
+
+    # Download the image.
+    job.info("    > Downloading image...")
+    image_download = session.get(download_url, stream=True)
+
+    if image_download.status_code != 200:
+        job.error("    > There was an error when trying to download the image.")
+        job.problem = True
+        job.info("    > Aborted!")
+        return (None, False)
+
+    # Save the image to a file.
+    job.info("    > Saving image...")
+
+    # Ensure the dbid has a folder for saving the image into. Another download may be creating it at the same time.
+    os.makedirs(dbid, exist_ok=True)
+
+    content_type = image_download.headers['content-type']
+    extension = mimetypes.guess_extension(content_type).strip('.')
+    if extension == 'jpeg' or extension == 'jpe':
+        extension = 'jpg'
+
+    try:
+        with open("{0}/{1}.{2}".format(dbid, job.iid, extension), 'wb') as f:
+            for chunk in image_download.iter_content(1024):
+                f.write(chunk)
+    except Exception as e:
+        job.error('    > There was an unknown error when saving the file: ' + str(e))
+        job.info("    > Aborted!")
+        return (extension, False)
+
+    job.info("    > Image file saved successfully.")
+    return (extension, True)
+
+def process_apids(apid_matches, *, session, csv_writer, logger, record_page_workers=RECORD_PAGE_WORKERS,
+                  media_info_workers=MEDIA_INFO_WORKERS, download_workers=DOWNLOAD_WORKERS):
     """
-    Given a list of APID tuples as returned by `process_gedcom_text()`,
-    an active session, and a csv writer, it downloads images from Ancestry.com.
+    Given a list of APID tuples as returned by `process_gedcom_text()`, or an iterable of them such as
+    `iter_apid_matches()` that is still finding them, an active session, and a csv writer, it downloads images from
+    Ancestry.com.
+
+    The record pages, image information and image downloads of the APID's are requested by separate stages, each
+    with its own number of workers, so the requests of several APID's are made at once. The APID's are still
+    checked against those previously processed, and written to the CSV file and log, in the order they are given.
 
     Presumes the current directory of `os` is the output directory.
 
     Returns a list of apids with errors.
     """
 
-    total_apid_matches = len(apid_matches)
+    # The total isn't known until an iterable of APID tuples runs out.
+    try:
+        total_apid_matches = len(apid_matches)
+    except TypeError:
+        total_apid_matches = None
     processed_apids = defaultdict(list) # A dict with dbids as keys, and items as a list of pids.
-    iid_regex = re.compile(r"var iid='([^\s']+)';")
     processed_iids = {} # A dict with IID's as keys, and the following object as items.
 
     class processed_iid(object):
@@ -213,128 +467,128 @@ def process_apids(apid_matches, *, session, csv_writer, logger):
 
     problem_apids = set()
 
-    # Process each apid.
-    for i, match in enumerate(apid_matches, start=1):
-
-        sour, apid, indiv, dbid, pid = match
+    # The APID's waiting for their record page, then those waiting for their image, in the order they were given.
+    record_queue = deque()
+    image_queue = deque()
 
-        fields = {
-            'sour': sour,
-            'apid': apid,
-            'indiv': indiv,
-            'dbid': dbid,
-            'pid': pid,
-        }
+    def check_image(job):
+        """
+        Check the image id found on the record page of an APID against those previously processed, and pass it on to
+        the image stages if it is new. Called for each APID in the order they were given.
+        """
 
-        logger.info("Processing APID {0} of {1} <APID {2}>...".format(i, total_apid_matches, apid))
+        job.result()
+        job.future = None
+        fields = job.fields
+        iid = job.iid
+        if job.previous or job.problem:
+            return
 
-        # Check if the apid has previously been processed.
-        if dbid in processed_apids and pid in processed_apids[dbid]:
-            logger.info("    > APID previously processed as part of another source.")
-            logger.info("    > Finished!")
-            continue
-        else:
-            # Mark the apid as processed now, so even if something fails, we know not to check it again.
-            processed_apids[dbid].append(pid)
-
-        # Visit the record page corresponding to the app id.
-        logger.info("    > Getting the record page for the APID...")
-        record_page = session.get('http://search.ancestry.com/cgi-bin/sse.dll?indiv={0}&dbid={1}&h={2}'.format(indiv, dbid, pid))
-        if record_page.status_code != 200:
-            logger.error("    > There was an error when trying to get the record page for the APID.")
-            problem_apids.add(apid)
-            logger.info("    > Aborted!")
-            continue
-
-        # Extract the image id associated with the record from the returned html.
-        logger.info("    > Processing the record page to determine the image ID...")
-        match = iid_regex.search(record_page.text)
-
-        if not match:
+        if iid is None:
             # TODO, more and better checks could be performed rather than presuming there is no image at this stage, such as checking for a thumbnail.
-            logger.info("    > An image ID could not be found. Either the record does not have an image, or the record page was in an unexpected format.")
+            job.info("    > An image ID could not be found. Either the record does not have an image, or the record page was in an unexpected format.")
             fields['image'] = ''
             fields['extension'] = ''
-            logger.info("    > Writing results to CSV file...")
-            csv_writer.writerow(fields)
-            logger.info("    > Finished!")
-            continue
-
-        fields['image'] = iid = match.group(1)
-
-        # Check if the iid has previously been processed.
-        if iid in processed_iids:
-            logger.info("    > The image for this record has previously been processed.")
-            fields['extension'] = processed_iids[iid].extension
-            logger.info("    > Writing results to CSV file...")
-            csv_writer.writerow(fields)
-            processed_iids[iid].apids.append(apid)
-            logger.info("    > Finished!")
-            continue
+            job.write = True
+            return
+
+        fields['image'] = iid
+        job.image = processed_iids.get(iid)
+
+        # Check if the iid has previously been processed. Its image may still be downloading, so the extension is only
+        # looked up when the APID is finished.
+        if job.image is not None:
+            job.info("    > The image for this record has previously been processed.")
+            job.image.apids.append(fields['apid'])
+            job.write = True
         else:
             # Mark the iid as processed now, so even if something fails, we know not to check it again.
-            processed_iids[iid] = processed_iid(None, [apid])
-
-        # Get the api data related to the image.
-        logger.info("    > Get information regarding the image...")
-        image_page = session.get('http://interactive.ancestry.com/api/v2/Media/GetMediaInfo/{0}/{1}/{2}'.format(dbid, iid, pid))
-        if record_page.status_code != 200:
-            logger.error("    > There was an error when trying to get the image info.")
-            problem_apids.add(apid)
-            logger.info("    > Aborted!")
-            continue
-
-        # Extract the download url for the returned json.
-        logger.info("    > Processing the image information...")
-        image_page_json = image_page.json()
-        try:
-            download_url = image_page_json['ImageServiceUrlForDownload']
-        except KeyError:
-            logger.error("    > There was an error when trying to get the download URL from the image info.")
-            problem_apids.add(apid)
-            logger.info("    > Aborted!")
-            continue
-
-        # Download the image.
-        logger.info("    > Downloading image...")
-        image_download = session.get(download_url, stream=True)
-
-        if image_download.status_code != 200:
-            logger.error("    > There was an error when trying to download the image.")
-            problem_apids.add(apid)
-            logger.info("    > Aborted!")
-            continue
-
-        # Save the image to a file.
-        logger.info("    > Saving image...")
-
-        # Ensure the dbid has a folder for saving the image into.
-        if not os.path.exists(dbid):
-            os.makedirs(dbid)
-
-        content_type = image_download.headers['content-type']
-        extension = mimetypes.guess_extension(content_type).strip('.')
-        if extension == 'jpeg' or extension == 'jpe':
-            extension = 'jpg'
-        fields['extension'] = extension
-        # Ensure the extension has been recorded for later use.
-        if processed_iids[iid].extension == None: processed_iids[iid].extension = extension
-
-        try:
-            with open("{0}/{1}.{2}".format(dbid, iid, extension), 'wb') as f:
-                for chunk in image_download.iter_content(1024):
-                    f.write(chunk)
-        except Exception as e:
-            logger.error('    > There was an unknown error when saving the file: ' + str(e))
-            logger.info("    > Aborted!")
-            continue
-
-        logger.info("    > Image file saved successfully.")
+            job.image = processed_iids[iid] = processed_iid(None, [fields['apid']])
+            job.future = media_info_pool.submit(get_media_info, session, job, download_pool)
+
+    def finish(job):
+        """
+        Write the results of an APID to the log and CSV file. Called for each APID in the order they were given.
+        """
+
+        result = job.result()
+        fields = job.fields
+
+        if result is not None:
+            # Ensure the extension has been recorded for later use, even if the image couldn't be saved.
+            extension, job.write = result
+            fields['extension'] = extension
+            if job.image.extension == None: job.image.extension = extension
+        elif job.write and job.image is not None:
+            # The image was processed with an earlier APID, which is finished by now.
+            fields['extension'] = job.image.extension
+
+        if job.problem:
+            problem_apids.add(fields['apid'])
+        elif job.write:
+            job.info("    > Writing results to CSV file...")
+            csv_writer.writerow(fields)
+            job.info("    > Finished!")
+
+        for level, message in job.messages:
+            logger.log(level, message)
+
+    def advance(drain=False):
+        """
+        Move the APID's at the front of the queues on to their next stage once they are ready, or the queue is full.
+        """
+
+        while True:
+            if image_queue and (image_queue[0].done() or len(image_queue) >= QUEUE_SIZE or (drain and not record_queue)):
+                finish(image_queue.popleft())
+            elif record_queue and (record_queue[0].done() or len(record_queue) >= QUEUE_SIZE or drain):
+                job = record_queue.popleft()
+                check_image(job)
+                image_queue.append(job)
+            else:
+                break
+
+    record_page_pool = ThreadPoolExecutor(max_workers=record_page_workers)
+    media_info_pool = ThreadPoolExecutor(max_workers=media_info_workers)
+    download_pool = ThreadPoolExecutor(max_workers=download_workers)
 
-        # Write results to csv file.
-        logger.info("    > Writing results to CSV file...")
-        csv_writer.writerow(fields)
-        logger.info("    > Finished!")
+    try:
+        # Process each apid.
+        for i, match in enumerate(apid_matches, start=1):
+
+            sour, apid, indiv, dbid, pid = match
+
+            job = apid_job({
+                'sour': sour,
+                'apid': apid,
+                'indiv': indiv,
+                'dbid': dbid,
+                'pid': pid,
+            })
+
+            if total_apid_matches is None:
+                job.info("Processing APID {0} <APID {1}>...".format(i, apid))
+            else:
+                job.info("Processing APID {0} of {1} <APID {2}>...".format(i, total_apid_matches, apid))
+
+            # Check if the apid has previously been processed.
+            if dbid in processed_apids and pid in processed_apids[dbid]:
+                job.info("    > APID previously processed as part of another source.")
+                job.info("    > Finished!")
+                job.previous = True
+            else:
+                # Mark the apid as processed now, so even if something fails, we know not to check it again.
+                processed_apids[dbid].append(pid)
+                job.future = record_page_pool.submit(get_record_page, session, job)
+
+            record_queue.append(job)
+            advance()
+
+        advance(drain=True)
+    finally:
+        # Stop any requests still waiting, if processing was interrupted.
+        for pool in (record_page_pool, media_info_pool, download_pool):
+            pool.shutdown(cancel_futures=True)
 
     # All done.
     return problem_apids
@@ -344,7 +598,7 @@ def run(*, gedcom, username, password, output_directory, output_filename=None):
     # Validate the gedcom file.
     print("Validating gedcom file...")
     try:
-        file_text = validate_gedcom_file(gedcom)
+        file_lines = validate_gedcom_file(gedcom)
     except GedcomFileInvalid as e:
         print("The following problem was encountered when validating the file;")
         print(e)
@@ -353,16 +607,25 @@ def run(*, gedcom, username, password, output_directory, output_filename=None):
     else:
         print("Gedcom file appears valid.")
 
-    # Process the gedcom file text.
-    print("Processing gedcom file (may take a few minutes)...")
-    apid_matches = process_gedcom_text(file_text)
+    # Process the gedcom file lines. The APIDs are found as the rest of the file is read while the images are
+    # downloaded, so only the first is looked for now.
+    print("Processing gedcom file...")
+    apid_matches = iter_apid_matches(file_lines)
+    try:
+        first_match = next(apid_matches, None)
+    except GedcomFileInvalid as e:
+        print("The following problem was encountered when processing the file;")
+        print(e)
+        print("Aborting.")
+        return
 
-    if len(apid_matches) == 0: # No apids to scrape images for.
+    if first_match is None: # No apids to scrape images for.
         print("Gedcom file processed, no matches found.")
         print("Finished.")
         return
     else:
-        print("Gedcom file processed, {0} matches found.".format(len(apid_matches)))
+        print("Gedcom file has matches, the rest are found as the images are downloaded.")
+        apid_matches = itertools.chain([first_match], apid_matches)
 
     question = "\nReady to start downloading images.\n\n"\
             "!!! Accessing Ancestry websites using an 'automatic access tool'\n"\
@@ -406,6 +669,10 @@ def run(*, gedcom, username, password, output_directory, output_filename=None):
         problem_apids = process_apids(apid_matches, session=session, csv_writer=csv_writer, logger=logger)
     except KeyboardInterrupt:
         print("Processing of APIDs interrupted.")
+    except GedcomFileInvalid as e:
+        # The rest of the file is read as the APIDs are processed, so a problem reading it stops them.
+        print("Processing of APIDs stopped, because the following problem was encountered when reading the file;")
+        print(e)
     else:
         print("All APID's processed. There were errors with {0} APIDs.".format(len(problem_apids)))
 
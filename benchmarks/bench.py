@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# USAGE: python3 benchmarks/bench.py
+# USAGE: ./benchmarks/bench.py --sizes 10000 100000 1000000 10000000 --save results.json
+# USAGE: ./benchmarks/bench.py --ops g6 g3,g5,g6 --baseline results.json
+#
+# Benchmarks the throughput (lines/sec) and peak memory (RSS) of
+# each gedscrub scrubbing option over synthetic GEDCOM files of
+# increasing size.  Every run is a separate gedscrub process so its
+# peak memory is its own.  Results can be saved as JSON and compared
+# against a saved baseline so regressions show up as numbers.
+
+import sys
+import os
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+
+import gengedcom
+
+# the gedscrub package lives in the directory above the benchmarks
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# every option that scrubs lines.  g1 & g2 download or relink media, so aren't benchmarked
+OPTIONS = ["g3", "g4", "g5", "g6", "m1", "m2", "a1", "a2"]
+SIZES = [10000, 100000, 1000000]
+
+
+################
+## FUNCTIONS ###
+################
+
+def parseargs():
+    """Function to parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark the gedscrub scrubbing options.')
+    parser.add_argument("--sizes", help="number of lines of each synthetic file (default: " +
+                                        " ".join(str(size) for size in SIZES) + ")", nargs="+", type=int,
+                        default=SIZES)
+    parser.add_argument("--ops", help="options to benchmark, each on its own.  Join options with commas to benchmark "
+                                      "them piped together (default: " + " ".join(OPTIONS) + ")", nargs="+",
+                        default=OPTIONS)
+    parser.add_argument("--repeat", help="runs of each option, the fastest is kept (default: 1)", type=int, default=1)
+    parser.add_argument("--work-dir", help="directory to keep the synthetic files in, so they are only generated "
+                                           "once (default: a temporary directory)", type=str)
+    parser.add_argument("--save", help="JSON file to save the results to", type=str)
+    parser.add_argument("--baseline", help="JSON file of saved results to compare against", type=str)
+    return parser.parse_args()
+
+
+def synthetic(work_dir, lines):
+    """return the path of a synthetic file of lines lines, generating it if it doesn't already exist"""
+    path = os.path.join(work_dir, "synthetic-" + str(lines) + ".ged")
+    if not os.path.exists(path):
+        print("generating " + path)
+        gengedcom.generate(path, lines)
+    return path
+
+
+def countlines(path):
+    with open(path, 'rb') as infile:
+        return sum(block.count(b"\n") for block in iter(lambda: infile.read(1 << 20), b""))
+
+
+def runoption(path, option, output):
+    """scrub path with option in its own gedscrub process.  Returns the wall time in seconds and the peak RSS in MB"""
+    command = [sys.executable, "-m", "gedscrub", "-i", path, "-o", output, "--overwrite", "-q", "-p"] + option.split(",")
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, cwd=REPO)
+
+    # wait4 returns the resource usage of this child alone.  ru_maxrss is in KB on Linux but bytes on macOS
+    pid, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(" ".join(command) + " failed with exit status " + str(process.returncode))
+    rss = usage.ru_maxrss / 1024
+    if sys.platform == "darwin":
+        rss = rss / 1024
+    return seconds, rss
+
+
+def loadresults(path):
+    """read saved results, keyed by option & size"""
+    with open(path, 'r') as infile:
+        return {(result["option"], result["lines"]): result for result in json.load(infile)["results"]}
+
+
+def change(now, before):
+    """percentage change from before to now"""
+    if before == 0:
+        return ""
+    return "{:+.1f}%".format((now - before) * 100.0 / before)
+
+
+def printresult(result, baseline):
+    text = "{:<12} {:>10} {:>9.2f}s {:>12,.0f} lines/s {:>8.1f} MB".format(
+        result["option"], result["lines"], result["seconds"], result["lines_per_sec"], result["peak_rss_mb"])
+    before = baseline.get((result["option"], result["lines"]))
+    if before is not None:
+        text = text + "   lines/s " + change(result["lines_per_sec"], before["lines_per_sec"]) + \
+            ", RSS " + change(result["peak_rss_mb"], before["peak_rss_mb"])
+    print(text)
+
+
+################
+##### MAIN #####
+################
+
+def main():
+    args = parseargs()
+    baseline = {}
+    if args.baseline is not None:
+        baseline = loadresults(args.baseline)
+
+    work_dir = args.work_dir
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix="gedscrub-bench-")
+    elif not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+
+    # gedscrub runs from the top of the repository, so the files are given to it by their absolute paths
+    work_dir = os.path.abspath(work_dir)
+    output = os.path.join(work_dir, "scrubbed.ged")
+
+    results = []
+    print("{:<12} {:>10} {:>10} {:>20} {:>11}".format("option", "lines", "time", "throughput", "peak RSS"))
+    for size in args.sizes:
+        path = synthetic(work_dir, size)
+        lines = countlines(path)
+        for option in args.ops:
+            seconds, rss = min(runoption(path, option, output) for i in range(max(args.repeat, 1)))
+            result = {"option": option, "lines": lines, "seconds": seconds, "lines_per_sec": lines / seconds,
+                      "peak_rss_mb": rss}
+            printresult(result, baseline)
+            results.append(result)
+    if os.path.exists(output):
+        os.remove(output)
+
+    if args.save is not None:
+        with open(args.save, 'w') as outfile:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "results": results}, outfile,
+                      indent=2)
+        print("results saved to " + args.save)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
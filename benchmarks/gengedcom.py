@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+# USAGE: python3 benchmarks/gengedcom.py -n 100000 -o synthetic.ged
+# USAGE: ./benchmarks/gengedcom.py -n 10000000 -o synthetic-10m.ged --seed 7
+# USAGE: python3 benchmarks/gengedcom.py -n 100000 -o windows.ged --crlf
+#
+# Writes a synthetic GEDCOM file for benchmarking gedscrub.  The
+# records look like the MyHeritage and Ancestry exports gedscrub is
+# used on: _UPD, _PRIM and other custom tags, _APID source
+# citations, HTML laden NOTE/TEXT values with escaped &amp;lt;br&amp;gt;
+# tags split over CONC lines, illegal bare newlines and FILE URLs.
+# The same seed always writes the same file.
+
+import sys
+import argparse
+import random
+
+# names, places & text the records are made from
+GIVEN_NAMES = ["Thomas", "Mary", "John", "Ann", "Patrick", "Bridget", "William", "Margaret", "James", "Catherine",
+               "Michael", "Ellen", "Johann", "Anna", "Carl", "Maria"]
+SURNAMES = ["O'Neil", "Smith", "Murphy", "Kelly", "Schmidt", "Muller", "Jones", "Walsh", "Byrne", "Weber"]
+PLACES = ["Douglas, Nebraska, USA", "Cork, Ireland", "Bavaria, Germany", "Cook, Illinois, USA",
+          "Galway, Ireland", "New York, New York, USA", "Hesse, Germany"]
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+CENSUS_DBIDS = ["6061", "7602", "6224", "7884", "2442"]
+WORDS = ["the", "family", "lived", "on", "a", "farm", "near", "river", "and", "later", "moved", "to", "town",
+         "where", "he", "worked", "as", "laborer", "she", "kept", "house", "church", "records", "show", "baptism"]
+
+# number of source records the citations point to
+SOURCES = 50
+
+
+################
+### CLASSES ####
+################
+
+class Generator(object):
+    """writes records until the file has at least the requested number of lines"""
+
+    def __init__(self, outfile, seed=1):
+        self.outfile = outfile
+        self.random = random.Random(seed)
+        self.lines = 0
+
+    def write(self, text):
+        self.outfile.write(text + "\n")
+        self.lines = self.lines + 1
+
+    def date(self):
+        return str(self.random.randint(1, 28)) + " " + self.random.choice(MONTHS) + " " + \
+            str(self.random.randint(1820, 1950))
+
+    def updated(self):
+        return str(self.random.randint(1, 28)) + " " + self.random.choice(MONTHS) + " 2019 " + \
+            "{:02d}:{:02d}:{:02d}".format(self.random.randint(0, 23), self.random.randint(0, 59),
+                                          self.random.randint(0, 59)) + " GMT -0500"
+
+    def sentence(self, words):
+        return " ".join(self.random.choice(WORDS) for i in range(words))
+
+    def htmlnote(self, level, tag):
+        """a NOTE or TEXT holding escaped HTML, split over CONC lines the way MyHeritage splits it"""
+        name = self.random.choice(GIVEN_NAMES) + " " + self.random.choice(SURNAMES)
+        text = name.replace("'", "&#039;") + "&amp;lt;br&amp;gt;Gender: " + self.random.choice(["Male", "Female"]) + \
+            "&amp;lt;br&amp;gt;Birth: Circa " + str(self.random.randint(1820, 1900)) + " - " + \
+            self.random.choice(PLACES) + "&amp;lt;br&amp;gt;Residence: " + self.random.choice(PLACES) + \
+            "&amp;lt;br&amp;gt;&amp;lt;a href=&quot;https://www.myheritage.com/research&quot;&amp;gt;" + \
+            self.sentence(4) + "&amp;lt;/a&amp;gt; <p>" + self.sentence(12) + "</p>"
+        # values are split every 60 or so characters, mid word, onto CONC lines
+        self.write(str(level) + " " + tag + " " + text[:60])
+        for i in range(60, len(text), 60):
+            self.write(str(level + 1) + " CONC " + text[i:i + 60])
+
+    def source(self, level):
+        """an Ancestry source citation"""
+        self.write(str(level) + " SOUR @S" + str(self.random.randint(1, SOURCES)) + "@")
+        self.write(str(level + 1) + " PAGE Year: " + str(self.random.randint(1850, 1940)) + "; Census Place: " +
+                   self.random.choice(PLACES))
+        self.write(str(level + 1) + " _APID 1," + self.random.choice(CENSUS_DBIDS) + "::" +
+                   str(self.random.randint(1, 99999999)))
+
+    def media(self, person):
+        """a MyHeritage media object"""
+        self.write("1 OBJE")
+        self.write("2 FORM jpg")
+        self.write("2 FILE https://www.myheritageimages.com/G/storage/site" + str(self.random.randint(1, 300)) +
+                   "/files/" + "{:02x}/{:02x}/".format(self.random.randint(0, 255), self.random.randint(0, 255)) +
+                   "p" + str(person) + "_" + str(self.random.randint(1, 9999)) + ".jpg")
+        self.write("2 TITL " + self.sentence(3))
+        if self.random.random() < 0.3:
+            self.write("2 _PRIM Y")
+
+    def event(self, tag):
+        self.write("1 " + tag)
+        self.write("2 DATE " + self.date())
+        self.write("2 PLAC " + self.random.choice(PLACES))
+        if self.random.random() < 0.6:
+            self.source(2)
+        if self.random.random() < 0.3:
+            self.htmlnote(2, "NOTE")
+
+    def header(self):
+        self.write("0 HEAD")
+        self.write("1 SOUR MYHERITAGE")
+        self.write("2 NAME MyHeritage Family Tree Builder")
+        self.write("2 VERS 5.5.1")
+        self.write("1 _PROJECT_GUID " + "".join(self.random.choice("0123456789ABCDEF") for i in range(32)))
+        self.write("1 CHAR UTF-8")
+        self.write("1 GEDC")
+        self.write("2 VERS 5.5.1")
+        self.write("2 FORM LINEAGE-LINKED")
+
+    def individual(self, number):
+        self.write("0 @I" + str(number) + "@ INDI")
+        self.write("1 _UPD " + self.updated())
+        given = self.random.choice(GIVEN_NAMES)
+        surname = self.random.choice(SURNAMES)
+        self.write("1 NAME " + given + " /" + surname + "/")
+        self.write("2 GIVN " + given)
+        self.write("2 SURN " + surname)
+        self.write("1 SEX " + self.random.choice(["M", "F"]))
+        self.event("BIRT")
+        if self.random.random() < 0.7:
+            self.event("DEAT")
+        if self.random.random() < 0.5:
+            self.event("RESI")
+        if self.random.random() < 0.5:
+            self.media(number)
+        if self.random.random() < 0.4:
+            self.write("1 _APID 1," + self.random.choice(CENSUS_DBIDS) + "::" + str(self.random.randint(1, 99999999)))
+        if self.random.random() < 0.4:
+            self.htmlnote(1, "NOTE")
+        if self.random.random() < 0.2:
+            # a text value exported with its newlines intact, which makes illegal lines
+            self.write("1 NOTE " + self.sentence(8))
+            self.write(self.sentence(6))
+            self.write("  " + self.sentence(5) + "  ")
+            self.write("2 CONT " + self.sentence(7))
+        if self.random.random() < 0.3:
+            self.write("1 SOUR @S" + str(self.random.randint(1, SOURCES)) + "@")
+            self.write("2 DATA")
+            self.htmlnote(3, "TEXT")
+        self.write("1 _UID " + "".join(self.random.choice("0123456789ABCDEF") for i in range(32)))
+        self.write("1 RIN MH:I" + str(number))
+
+    def family(self, number, people):
+        self.write("0 @F" + str(number) + "@ FAM")
+        self.write("1 _UPD " + self.updated())
+        self.write("1 HUSB @I" + str(self.random.randint(1, people)) + "@")
+        self.write("1 WIFE @I" + str(self.random.randint(1, people)) + "@")
+        self.write("1 CHIL @I" + str(self.random.randint(1, people)) + "@")
+        self.write("1 MARR")
+        self.write("2 DATE " + self.date())
+        self.write("1 RIN MH:F" + str(number))
+
+    def sourcerecord(self, number):
+        self.write("0 @S" + str(number) + "@ SOUR")
+        self.write("1 _UPD " + self.updated())
+        self.write("1 TITL " + str(self.random.randint(1850, 1940)) + " United States Federal Census")
+        self.write("1 AUTH Ancestry.com")
+        self.write("1 _APID 1," + self.random.choice(CENSUS_DBIDS) + "::0")
+        self.write("1 NOTE <a href=\"https://www.ancestry.com/search/collections/" + str(number) + "\">" +
+                   self.sentence(3) + "</a> " + self.sentence(5))
+
+    def run(self, lines):
+        """write a file of at least lines lines"""
+        self.header()
+        number = 0
+        while self.lines < lines - 1:
+            number = number + 1
+            self.individual(number)
+            if number % 3 == 0:
+                self.family(number // 3, number)
+            if number <= SOURCES * 10 and number % 10 == 0:
+                self.sourcerecord(number // 10)
+        self.write("0 TRLR")
+
+
+################
+## FUNCTIONS ###
+################
+
+def parseargs():
+    """Function to parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Write a synthetic GEDCOM file for benchmarking gedscrub.')
+    parser.add_argument("-n", "--lines", help="number of lines to write (default: 100000)", type=int, default=100000)
+    parser.add_argument("-o", "--output", help="GEDCOM file to write (default: standard output)", type=str)
+    parser.add_argument("--seed", help="random seed (default: 1)", type=int, default=1)
+    parser.add_argument("--crlf", help="end lines in \\r\\n like Windows & Ancestry exports", action="store_true")
+    return parser.parse_args()
+
+
+def generate(path, lines, seed=1, crlf=False):
+    """write a synthetic GEDCOM file of at least lines lines to path, ending them in \\r\\n if crlf.  Returns the number
+    of lines written"""
+    with open(path, 'w', buffering=1 << 20, newline="\r\n" if crlf else None) as outfile:
+        generator = Generator(outfile, seed)
+        generator.run(lines)
+    return generator.lines
+
+
+################
+##### MAIN #####
+################
+
+def main():
+    args = parseargs()
+    if args.output is None:
+        if args.crlf:
+            sys.stdout.reconfigure(newline="\r\n")
+        Generator(sys.stdout, args.seed).run(args.lines)
+    else:
+        print(str(generate(args.output, args.lines, args.seed, args.crlf)) + " lines written to " + args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
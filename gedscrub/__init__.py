@@ -0,0 +1,66 @@
+# USAGE: python3 -m gedscrub
+# USAGE: python3 -m gedscrub -i in.ged -o out.ged -p g5 g6 m2 --link-option 1
+# USAGE: python3 -m gedscrub -m jobs.json
+# USAGE: python3 -m gedscrub -b exports/ --output-dir scrubbed/ -p g3 g6 -j 8
+# USAGE: python3 -m gedscrub -i in.ged -o out.ged -p g3 g6 -q --changelog changes.csv
+# USAGE: python3 -m gedscrub -i in.ged -p g3 g5 g6 --dry-run
+# USAGE: python3 -m gedscrub -i in.ged -o out.ged -p g3 g6 -q --stats metrics.jsonl
+# USAGE: python3 -m gedscrub -i in.ged -o records.ged -p g3 g6 -r @I1234@ @S55@
+# USAGE: python3 -m gedscrub -i in.ged -o out.ged -p g3 g5 g6 --cache tree.cache
+# USAGE: python3 -m gedscrub -i ansel.ged -o out.ged -p g3 g6 --output-encoding UTF-8
+# USAGE: python3 -m gedscrub -i tree.gdz -o scrubbed.gdz -p g3 g5 g6
+# USAGE: python3 -m gedscrub --serve /tmp/gedscrub.sock -j 4
+# USAGE: python3 -c 'import gedscrub; gedscrub.scrub("in.ged", "out.ged", ["g5", "g6", "m2"])'
+#
+# Sean Begley
+# 2019-09-26
+#
+# This program is design to scrub a GEDCOM
+# (Genealogical Data Communication) file.  It
+# can perform functions like removing extraneous
+# entries inserted by various Genealogy programs,
+# download and sort linked media, update media
+# entires, etc.
+
+"""scrub a GEDCOM (Genealogical Data Communication) file to clean up and modify its contents"""
+
+import importlib
+
+__version__ = "1.0"
+
+from gedscrub.api import scrub, scrubtext, updatelinks, deletecustomtags, updatecustomtagstoNOTE, cleanNewLines, \
+    deleteHTML, deleteUPDtags, updateUPDtoNOTEtags, deleteAPIDtags, updateAPIDtoNOTEtags
+from gedscrub.changelog import ChangeWriter, ChangeLog, RecordingLog, StatsLog
+from gedscrub.charset import detectencoding, openinput, openoutput
+from gedscrub.gedcom import GedcomLine, parseline, parselines, makeline
+from gedscrub.index import RecordIndex, buildindex, openindex, runrecords
+from gedscrub.metrics import RunMetrics
+from gedscrub.pipeline import PIPELINE_OPTIONS, RECORD_OPTIONS, buildpipeline, runpipeline, runsharded
+
+__all__ = ["scrub", "scrubtext", "updatelinks", "deletecustomtags", "updatecustomtagstoNOTE", "cleanNewLines",
+           "deleteHTML", "deleteUPDtags", "updateUPDtoNOTEtags", "deleteAPIDtags", "updateAPIDtoNOTEtags",
+           "ChangeWriter", "ChangeLog", "RecordingLog", "StatsLog", "detectencoding", "openinput", "openoutput",
+           "GedcomLine", "parseline", "parselines", "makeline", "RecordIndex", "buildindex", "openindex", "runrecords",
+           "RunMetrics", "PIPELINE_OPTIONS", "RECORD_OPTIONS", "buildpipeline", "runpipeline", "runsharded",
+           "MAX_DOWNLOADS", "downloadimages", "loadmanifest", "runjob", "runbatch", "ScrubCache", "runcached", "main",
+           "serve"]
+
+# g1 downloads, batches, the cache & the command line pull in the network, process pool & SQLite modules, so they are
+# only imported when they are first used
+_LAZY = {
+    "MAX_DOWNLOADS": "gedscrub.media",
+    "downloadimages": "gedscrub.media",
+    "loadmanifest": "gedscrub.batch",
+    "runjob": "gedscrub.batch",
+    "runbatch": "gedscrub.batch",
+    "ScrubCache": "gedscrub.cache",
+    "runcached": "gedscrub.cache",
+    "main": "gedscrub.cli",
+    "serve": "gedscrub.server",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name]), name)
+    raise AttributeError("module 'gedscrub' has no attribute " + repr(name))
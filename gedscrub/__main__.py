@@ -0,0 +1,7 @@
+"""python3 -m gedscrub"""
+
+import sys
+
+from gedscrub.cli import main
+
+sys.exit(main())
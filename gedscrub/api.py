@@ -0,0 +1,102 @@
+"""scrubbing GEDCOM files, streams and strings from other programs"""
+
+import contextlib
+import io
+import os
+
+from gedscrub.changelog import ChangeLog
+from gedscrub.charset import openinput, openoutput, relabel
+from gedscrub.pipeline import buildpipeline, runpipeline, runsharded
+
+
+################
+## FUNCTIONS ###
+################
+
+@contextlib.contextmanager
+def openstream(target, mode, encoding=None, source=None):
+    """open target if it is a path, otherwise use it as the open text stream it already is.  A path is read in the
+    character set it names, or encoding, and written in encoding.  Either may be compressed"""
+    if isinstance(target, (str, bytes, os.PathLike)):
+        with (openinput(target, encoding) if mode == 'r' else openoutput(target, encoding, source)) as stream:
+            yield stream
+    else:
+        yield target
+
+
+def scrub(source, destination, options, link_option='1', parent_dir='', log=None, workers=None, metrics=None,
+          encoding=None, output_encoding=None):
+    """scrub source into destination with the scrubbing options (g2-g6, m1, m2, a1 & a2) in order.  Each may be a path
+    or an open text stream.  The changes are reported to log, which only counts them by default, and log is returned.
+    More than one worker splits the file into chunks that are scrubbed in parallel.  A source path is read in the
+    character set picked by its byte order mark & 1 CHAR line unless encoding is given, and the output is written in
+    the same one unless output_encoding is given, in which case the 1 CHAR line is rewritten to match"""
+    if log is None:
+        log = ChangeLog(quiet=True)
+    options = [option.lower() for option in options]
+    parent_dir = os.path.join(parent_dir or '', '')
+
+    # the options are checked before the destination is opened
+    stages = buildpipeline(options, link_option=link_option, parent_dir=parent_dir, log=log)
+    with openstream(source, 'r', encoding) as infile, \
+            openstream(destination, 'w', output_encoding or getattr(infile, "encoding", None),
+                       source if isinstance(source, (str, os.PathLike)) else None) as outfile:
+        outfile = relabel(outfile, output_encoding)
+        if workers is not None and workers > 1:
+            runsharded(infile, outfile, options, link_option, parent_dir, log, workers, metrics=metrics)
+        else:
+            runpipeline(infile, outfile, stages, metrics.meters(options) if metrics is not None else None)
+    return log
+
+
+def scrubtext(text, options, link_option='1', parent_dir='', log=None):
+    """scrub a whole GEDCOM file held in a string, returning the scrubbed string"""
+    # newlines are read the same way as from a file opened in text mode
+    outfile = io.StringIO()
+    scrub(io.StringIO(text, newline=None), outfile, options, link_option, parent_dir, log)
+    return outfile.getvalue()
+
+
+def updatelinks(infile, outfile, parent_dir, log=None):
+    """g2: replace FILE hyperlinks with local addresses under parent_dir"""
+    return scrub(infile, outfile, ["g2"], parent_dir=parent_dir, log=log)
+
+
+def deletecustomtags(infile, outfile, log=None):
+    """g3: delete all custom tags"""
+    return scrub(infile, outfile, ["g3"], log=log)
+
+
+def updatecustomtagstoNOTE(infile, outfile, log=None):
+    """g4: convert all custom tags into NOTE fields"""
+    return scrub(infile, outfile, ["g4"], log=log)
+
+
+def cleanNewLines(infile, outfile, log=None):
+    """g5: convert all illegal new lines to CONT lines"""
+    return scrub(infile, outfile, ["g5"], log=log)
+
+
+def deleteHTML(infile, outfile, link_option, log=None):
+    """g6: delete HTML embedded in fields, doing what link_option says with <a href> links"""
+    return scrub(infile, outfile, ["g6"], link_option=link_option, log=log)
+
+
+def deleteUPDtags(infile, outfile, log=None):
+    """m1: delete all _UPD tags"""
+    return scrub(infile, outfile, ["m1"], log=log)
+
+
+def updateUPDtoNOTEtags(infile, outfile, log=None):
+    """m2: convert all _UPD tags into NOTE fields"""
+    return scrub(infile, outfile, ["m2"], log=log)
+
+
+def deleteAPIDtags(infile, outfile, log=None):
+    """a1: delete all _APID tags"""
+    return scrub(infile, outfile, ["a1"], log=log)
+
+
+def updateAPIDtoNOTEtags(infile, outfile, log=None):
+    """a2: convert all _APID tags into NOTE fields"""
+    return scrub(infile, outfile, ["a2"], log=log)
@@ -0,0 +1,194 @@
+"""reading & writing GEDCOM files compressed with gzip or zstd, or in a zip archive like GEDZIP, as streams so they're
+scrubbed without a decompressed copy on disk"""
+
+import gzip
+import io
+import os
+import shutil
+import zipfile
+import zlib
+
+# REFERENCES
+# https://gedcom.io/specifications/FamilySearchGEDCOMv7.html#gedzip
+
+
+# the compression of an input is picked from its 1st bytes, and of an output from its extension
+MAGIC = [(b"\x1f\x8b", "gzip"), (b"PK\x03\x04", "zip"), (b"\x28\xb5\x2f\xfd", "zstd")]
+SUFFIXES = {".gz": "gzip", ".zst": "zstd", ".zip": "zip", ".gdz": "zip"}
+
+# the GEDCOM file of a GEDZIP archive.  Everything else in the archive is media
+GEDZIP_MEMBER = "gedcom.ged"
+
+# gzip compression level of outputs, the same as the gzip command's default
+GZIP_LEVEL = 6
+
+# bytes copied at a time from the media of one archive to another
+COPY_CHUNK = 1 << 20
+
+# what the decompressors raise for a truncated or corrupt archive, which is reported as a ValueError like any other bad
+# input.  zstd adds its own error
+CORRUPT_ERRORS = (EOFError, zlib.error, zipfile.BadZipFile, gzip.BadGzipFile)
+
+
+################
+### CLASSES ####
+################
+
+class ArchiveReader(io.RawIOBase):
+    """reads the decompressed bytes of a GEDCOM file, turning the errors of a truncated or corrupt archive into a
+    ValueError however far into the file they're found"""
+
+    def __init__(self, stream, path, errors=CORRUPT_ERRORS):
+        io.RawIOBase.__init__(self)
+        self.stream = stream
+        self.path = path
+        self.errors = errors
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        try:
+            return self.stream.readinto(buffer)
+        except self.errors as e:
+            raise corrupt(self.path, e)
+
+    def read(self, size=-1):
+        try:
+            return self.stream.read(size)
+        except self.errors as e:
+            raise corrupt(self.path, e)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.stream.close()
+        finally:
+            io.RawIOBase.close(self)
+
+
+class ArchiveWriter(io.RawIOBase):
+    """writes a GEDCOM file into a zip archive as it's scrubbed.  Closing it copies the media of the source archive
+    after it, so the scrubbed archive keeps them"""
+
+    def __init__(self, path, member, source=None):
+        io.RawIOBase.__init__(self)
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        self.member = member
+        self.source = source
+        self.stream = self.archive.open(member, 'w', force_zip64=True)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.stream.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.stream.close()
+            if self.source is not None:
+                try:
+                    copymedia(self.source, self.archive, self.member)
+                except CORRUPT_ERRORS as e:
+                    raise corrupt(self.source, e)
+        finally:
+            self.archive.close()
+            io.RawIOBase.close(self)
+
+
+################
+## FUNCTIONS ###
+################
+
+def importzstd():
+    # zstd needs the zstandard package, which only the people who use it have to install
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("reading & writing .zst files requires the zstandard package")
+    return zstandard
+
+
+def corrupt(path, e):
+    return ValueError(path + " is a corrupt or truncated archive: " + str(e))
+
+
+def compression(path, mode='r'):
+    """return how the file at path is, or is to be, compressed: gzip, zstd, zip or None"""
+    if mode == 'r':
+        with open(path, 'rb') as infile:
+            data = infile.read(4)
+        for magic, kind in MAGIC:
+            if data.startswith(magic):
+                return kind
+        return None
+    return SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def findmember(archive, path):
+    """the name of the GEDCOM file in a zip archive: gedcom.ged in a GEDZIP archive, otherwise the 1st .ged file"""
+    names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    if GEDZIP_MEMBER in names:
+        return GEDZIP_MEMBER
+    for name in names:
+        if name.lower().endswith(".ged"):
+            return name
+    raise ValueError("no GEDCOM file in " + path)
+
+
+def openreader(path, kind):
+    """open the decompressed bytes of a GEDCOM file compressed the kind of way compression() found"""
+    if kind == "gzip":
+        return ArchiveReader(gzip.open(path, 'rb'), path)
+    if kind == "zstd":
+        zstandard = importzstd()
+        return ArchiveReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True), path,
+                             CORRUPT_ERRORS + (zstandard.ZstdError,))
+
+    # the member keeps the archive's file open until it's closed itself
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return ArchiveReader(archive.open(findmember(archive, path)), path)
+    except zipfile.BadZipFile as e:
+        raise ValueError(path + " isn't a zip archive: " + str(e))
+
+
+def openwriter(path, kind, source=None):
+    """open a stream of bytes compressing a GEDCOM file into path the kind of way compression() picked.  A zip archive
+    gets the media of source too, if it's a zip archive itself"""
+    if kind == "gzip":
+        return gzip.open(path, 'wb', compresslevel=GZIP_LEVEL)
+    if kind == "zstd":
+        return importzstd().ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+
+    # the GEDCOM file of the output has the same name as in the source archive, which is gedcom.ged for GEDZIP
+    member = GEDZIP_MEMBER
+    if source is None or compression(source) != "zip":
+        source = None
+    else:
+        try:
+            with zipfile.ZipFile(source) as archive:
+                member = findmember(archive, source)
+        except zipfile.BadZipFile as e:
+            raise ValueError(source + " isn't a zip archive: " + str(e))
+    return ArchiveWriter(path, member, source)
+
+
+def copymedia(source, archive, member):
+    """copy everything but the GEDCOM file member from the zip archive source to archive"""
+    with zipfile.ZipFile(source) as media:
+        for info in media.infolist():
+            if info.filename == member:
+                continue
+            copy = zipfile.ZipInfo(info.filename, info.date_time)
+            copy.compress_type = info.compress_type
+            copy.external_attr = info.external_attr
+            if info.is_dir():
+                archive.writestr(copy, b"")
+                continue
+            with media.open(info) as infile, archive.open(copy, 'w', force_zip64=True) as outfile:
+                shutil.copyfileobj(infile, outfile, COPY_CHUNK)
@@ -0,0 +1,299 @@
+"""running scrubbing jobs without prompting, one at a time or a batch in parallel"""
+
+import concurrent.futures
+import contextlib
+import glob
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+from gedscrub.cache import ScrubCache, runcached
+from gedscrub.changelog import ChangeWriter, ChangeLog, StatsLog
+from gedscrub.charset import inputencoding, openinput, openoutput, relabel
+from gedscrub.index import openindex, runrecords
+from gedscrub.media import MAX_DOWNLOADS, downloadimages
+from gedscrub.metrics import RunMetrics, cputime
+from gedscrub.ops import HTML_MEMO
+from gedscrub.pipeline import RECORD_OPTIONS, NullFile, buildpipeline, runpipeline, runsharded, runcounted
+
+# the files of a directory scrubbed as a batch.  Compressed files are written back compressed the same way
+BATCH_PATTERNS = ["*.ged", "*.ged.gz", "*.ged.zst", "*.gdz", "*.zip"]
+
+
+################
+## FUNCTIONS ###
+################
+
+def loadmanifest(path):
+    """read the list of jobs from a JSON or TOML job manifest"""
+
+    # the manifest may describe a single job, or a list of jobs under "jobs".  Every other top level key is a default
+    # for all of the jobs.  Relative paths are relative to the directory holding the manifest
+    if path.lower().endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("reading TOML manifests requires Python 3.11 or newer")
+        with open(path, 'rb') as manifestfile:
+            manifest = tomllib.load(manifestfile)
+    else:
+        with open(path, 'r') as manifestfile:
+            manifest = json.load(manifestfile)
+
+    if not isinstance(manifest, dict):
+        raise ValueError("manifest " + path + " must contain an object")
+
+    defaults = {key: value for key, value in manifest.items() if key != "jobs"}
+    basedir = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for entry in manifest.get("jobs", [{}]):
+        job = dict(defaults)
+        job.update(entry)
+        for key in ("input", "output", "parent_dir", "download_dir", "changelog", "index", "cache"):
+            if job.get(key) is not None:
+                job[key] = os.path.join(basedir, job[key])
+        jobs.append(job)
+    return jobs
+
+
+def findbatch(pattern):
+    """return the GEDCOM files, compressed or not, in a directory, or the files matching a glob pattern"""
+    if os.path.isdir(pattern):
+        paths = itertools.chain.from_iterable(glob.glob(os.path.join(pattern, suffix)) for suffix in BATCH_PATTERNS)
+    else:
+        paths = glob.glob(pattern)
+    return sorted(path for path in set(paths) if os.path.isfile(path))
+
+
+def makechangelog(job, quiet=False):
+    """return the ChangeLog for a job, writing its changes to the job's change log file if it has one.  A dry run
+    counts the changes in a StatsLog instead of printing them"""
+    writer = None
+    if job.get("changelog") is not None:
+        writer = ChangeWriter(job["changelog"], job.get("changelog_format"))
+    if job.get("dry_run"):
+        return StatsLog(writer)
+    return ChangeLog(quiet, writer)
+
+
+def runjob(job, overwrite=False, log=None, workers=None, metrics=None):
+    """run a single non-interactive scrubbing job, reporting its changes to log and measuring it in metrics.  More than
+    one worker splits the file into chunks that are scrubbed in parallel"""
+    # options may be given as a list or as a comma or space separated string
+    options = job.get("ops") or []
+    if isinstance(options, str):
+        options = [options]
+    options = " ".join(options).replace(",", " ").lower().split()
+
+    if job.get("input") is None or not os.path.exists(job["input"]):
+        raise ValueError("input file " + str(job.get("input")) + " doesn't exist")
+    if len(options) == 0:
+        raise ValueError("no scrubbing options given for " + job["input"])
+
+    # g1 only downloads files, so it runs on its own before the rest of the options are piped together
+    if "g1" in options:
+        if job.get("dry_run"):
+            print("g1 doesn't download anything in a dry run")
+        else:
+            if job.get("download_dir") is None:
+                raise ValueError("g1 requires a download directory")
+            if os.path.isfile(job["download_dir"]):
+                raise ValueError("download directory " + job["download_dir"] + " points to a file")
+            wall = time.perf_counter()
+            cpu = cputime()
+            with openinput(job["input"], job.get("encoding")) as infile:
+                downloadimages(infile, os.path.join(job["download_dir"], ''),
+                               int(job.get("max_downloads") or MAX_DOWNLOADS))
+            if metrics is not None:
+                metrics.downloads = (time.perf_counter() - wall, cputime() - cpu)
+        options = [option for option in options if option != "g1"]
+        if len(options) == 0:
+            return
+
+    # the g6 memo lasts as long as the process, so it keeps the size of the last job that set one
+    if job.get("memo_size") is not None:
+        HTML_MEMO.resize(int(job["memo_size"]))
+
+    link_option = str(job.get("link_option", "1"))
+    parent_dir = os.path.join(job.get("parent_dir") or '', '')
+    stages = buildpipeline(options, link_option=link_option, parent_dir=parent_dir, log=log)
+
+    # only the selected records are read, by their byte offsets in the index of the file, and only they are written
+    if job.get("records"):
+        runselected(job, overwrite, options, stages, metrics)
+        return
+
+    # records already in the cache are copied from it, only the new & changed records are scrubbed
+    if job.get("cache") is not None:
+        runwithcache(job, overwrite, options, link_option, parent_dir, log, metrics)
+        return
+
+    # a dry run streams the input through the options without writing anything.  When only the counts are wanted the
+    # workers send back nothing else
+    if job.get("dry_run"):
+        with openinput(job["input"], job.get("encoding")) as infile:
+            if workers is not None and workers > 1 and isinstance(log, StatsLog) and log.writer is None:
+                runcounted(infile, options, link_option, parent_dir, log, workers, metrics=metrics)
+            elif workers is not None and workers > 1:
+                runsharded(infile, NullFile(), options, link_option, parent_dir, log, workers, metrics=metrics)
+            else:
+                runpipeline(infile, NullFile(), stages, metrics.meters(options) if metrics is not None else None)
+        return
+
+    # the input is decompressed & decoded, and the output encoded & compressed, as they're read & written.  The output
+    # is in the input's character set unless the job gives it another, whose name goes in the 1 CHAR line
+    with openinput(job["input"], job.get("encoding")) as infile, \
+            writeoutput(job, overwrite, job.get("output_encoding") or infile.encoding) as outfile:
+        if workers is not None and workers > 1:
+            runsharded(infile, outfile, options, link_option, parent_dir, log, workers, metrics=metrics)
+        else:
+            runpipeline(infile, outfile, stages, metrics.meters(options) if metrics is not None else None)
+
+
+def checkoutput(job, overwrite=False):
+    """make sure the output file of a job can be written"""
+    if job.get("output") is None:
+        raise ValueError("no output file given for " + job["input"])
+    if os.path.exists(job["output"]):
+        if not overwrite:
+            raise ValueError("output file " + job["output"] + " already exists")
+        if os.path.samefile(job["input"], job["output"]):
+            raise ValueError("output file " + job["output"] + " is the input file")
+
+
+@contextlib.contextmanager
+def writeoutput(job, overwrite=False, encoding=None):
+    """open the output file of a job for writing in encoding.  It's written under a temporary name in the same
+    directory that only replaces the output once the job succeeds, so a failed job doesn't leave a partial output
+    behind that the next run would refuse to overwrite"""
+    checkoutput(job, overwrite)
+    path = job["output"]
+    # the temporary name ends in the output's name so it's compressed the same way
+    temp = os.path.join(os.path.dirname(path), "." + str(os.getpid()) + "-" + str(threading.get_ident()) + "." +
+                        os.path.basename(path))
+    try:
+        with openoutput(temp, encoding, job["input"]) as outfile:
+            yield relabel(outfile, job.get("output_encoding"))
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def runselected(job, overwrite, options, stages, metrics=None):
+    """scrub only the records of a job picked by its "records" xrefs & record types, through the index of its input"""
+    if not all(option in RECORD_OPTIONS for option in options):
+        raise ValueError("only " + ", ".join(RECORD_OPTIONS) + " can scrub selected records")
+    selectors = job["records"]
+    if isinstance(selectors, str):
+        selectors = selectors.replace(",", " ").split()
+    records = openindex(job["input"], job.get("index"), job.get("encoding")).select(selectors)
+    meters = metrics.meters(options) if metrics is not None else None
+    if metrics is not None:
+        metrics.bytes_read = sum(record.length for record in records)
+
+    encoding = inputencoding(job["input"], job.get("encoding"))
+    if job.get("dry_run"):
+        runrecords(job["input"], NullFile(), records, stages, meters, encoding)
+        return
+    with writeoutput(job, overwrite, job.get("output_encoding") or encoding) as outfile:
+        runrecords(job["input"], outfile, records, stages, meters, encoding)
+
+
+def runwithcache(job, overwrite, options, link_option, parent_dir, log, metrics=None):
+    """scrub a job through the cache of its "cache" file"""
+    if not all(option in RECORD_OPTIONS for option in options):
+        raise ValueError("only " + ", ".join(RECORD_OPTIONS) + " can be cached")
+    if not job.get("dry_run"):
+        # refuse an output that can't be written before the cache is opened
+        checkoutput(job, overwrite)
+    meters = metrics.meters(options) if metrics is not None else None
+    # a dry run reads the cache but doesn't write to it
+    cache = ScrubCache(job["cache"], readonly=bool(job.get("dry_run")))
+    try:
+        with openinput(job["input"], job.get("encoding")) as infile:
+            if job.get("dry_run"):
+                runcached(infile, NullFile(), options, cache, link_option, parent_dir, log, meters)
+            else:
+                with writeoutput(job, overwrite, job.get("output_encoding") or infile.encoding) as outfile:
+                    runcached(infile, outfile, options, cache, link_option, parent_dir, log, meters)
+    finally:
+        cache.close()
+    if metrics is not None:
+        metrics.cache = (cache.hits, cache.misses)
+
+
+def scrubjob(job, overwrite=False, metered=False):
+    """run a job in a batch worker process.  Changes are counted rather than printed and the result is returned, with
+    the --stats metrics of the job if metered"""
+    start = time.time()
+    result = {"input": job.get("input"), "output": job.get("output"), "status": "ok", "error": ""}
+    log = ChangeLog(quiet=True)
+    metrics = RunMetrics() if metered else None
+    try:
+        log = makechangelog(job, quiet=True)
+        if metrics is not None:
+            metrics.begin()
+        runjob(job, overwrite, log, metrics=metrics)
+        if metrics is not None:
+            metrics.end()
+            result["metrics"] = metrics.record(job, log)
+    except Exception as e:
+        # any error fails only this job, the rest of the batch carries on & gets its summary
+        result["status"] = "failed"
+        result["error"] = str(e)
+    finally:
+        log.close()
+    result["deleted"] = log.deleted
+    result["updated"] = log.updated
+    if isinstance(log, StatsLog):
+        result["stats"] = log.stats
+    result["seconds"] = time.time() - start
+    return result
+
+
+def printtostderr():
+    """print what a batch worker prints to standard error"""
+    sys.stdout = sys.stderr
+
+
+def runbatch(jobs, overwrite=False, workers=None, quiet=False, metrics=None):
+    """spread the jobs across a pool of worker processes, printing the result of each file as it finishes unless quiet
+    and a summary at the end.  The --stats metrics of each job are appended to the metrics list if it is given.
+    Returns the number of failed jobs"""
+    start = time.time()
+    failures = 0
+    deleted = 0
+    updated = 0
+    stats = StatsLog()
+
+    # the workers print where this process prints, which is standard error when the --stats metrics are on standard
+    # output.  A forked worker already does, a spawned one has to be told
+    initializer = printtostderr if sys.stdout is sys.stderr else None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initializer) as executor:
+        futures = [executor.submit(scrubjob, job, overwrite, metrics is not None) for job in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if result["status"] == "ok":
+                if not quiet:
+                    print("ok     " + str(result["input"]) + ": " + str(result["deleted"]) + " lines deleted, " +
+                          str(result["updated"]) + " updated in " + "{:.2f}".format(result["seconds"]) + "s")
+                deleted = deleted + result["deleted"]
+                updated = updated + result["updated"]
+                if "stats" in result:
+                    stats.merge(result["stats"])
+                if "metrics" in result:
+                    metrics.append(result["metrics"])
+            else:
+                print("FAILED " + str(result["input"]) + ": " + result["error"])
+                failures = failures + 1
+
+    print(str(len(jobs) - failures) + " of " + str(len(jobs)) + " files scrubbed successfully, " + str(deleted) +
+          " lines deleted, " + str(updated) + " updated in " + "{:.2f}".format(time.time() - start) + "s")
+    if any(job.get("dry_run") for job in jobs):
+        stats.printstats()
+    return failures
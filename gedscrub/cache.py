@@ -0,0 +1,346 @@
+"""a cache of scrubbed level 0 records keyed by a hash of their content and the scrubbing options, so re-scrubbing a
+new export of the same tree only runs the options over the records that changed"""
+
+import bisect
+import collections
+import functools
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+
+from gedscrub import __version__
+from gedscrub.changelog import ChangeLog, RecordingLog
+from gedscrub.gedcom import GedcomLine, parselines, isrecordstart, findrecordstarts
+from gedscrub.pipeline import RECORD_OPTIONS, buildpipeline, chainstages
+
+# characters of the input read at a time, and looked up in the cache at a time
+BATCH_SIZE = 1 << 18
+
+# KB of the cache file SQLite keeps in memory
+CACHE_KB = 256 * 1024
+
+# largest number of keys looked up in a single query
+LOOKUP_KEYS = 500
+
+
+################
+### CLASSES ####
+################
+
+class ScrubCache(object):
+    """the scrubbed text of records, and the changes made to them, in a SQLite database.  The records of the same
+    options not used by a run are pruned afterwards so the cache only holds the latest export of a tree.  Use one cache
+    file per tree.  A readonly cache, for a dry run, only looks records up and never creates or changes the file"""
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.db = None
+        if readonly and os.path.exists(path):
+            self.db = sqlite3.connect(pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro", uri=True, timeout=60)
+            if self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'records'").fetchone() is None:
+                self.db.close()
+                self.db = None
+        # a readonly cache without a cache file to read is an empty one in memory
+        if self.db is None:
+            self.db = sqlite3.connect(":memory:" if readonly else path, timeout=60)
+        # the records are found by the 1st 8 bytes of their key as the rowid, so finding one is a single search.  The
+        # keys are hashes so the records are read & written all over the file, which is much faster with a large page
+        # cache.  The counts come before the changes as most runs only read the counts
+        self.db.execute("PRAGMA cache_size = -" + str(CACHE_KB))
+        self.db.execute("CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY, key BLOB, config TEXT, text TEXT, "
+                        "counts TEXT, changes TEXT)")
+        self.config = None
+        self.digest = None
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, options, link_option):
+        """set the scrubbing options the records are cached for.  A new version of gedscrub may scrub differently so it
+        is part of the options"""
+        self.config = json.dumps([__version__, list(options), link_option])
+        self.digest = hashlib.blake2b(self.config.encode("utf-8"), digest_size=20)
+
+    def key(self, text):
+        """the key of a record: a hash of the options and its text"""
+        digest = self.digest.copy()
+        digest.update(text.encode("utf-8", errors="surrogatepass"))
+        return digest.digest()
+
+    def lookup(self, keys, changes=True):
+        """return the cached (text, changes) of whichever of keys are in the cache, or (text, counts) if not changes.
+        Records cached by an older version that only kept the counts of a run that counted its changes aren't found
+        when the changes are wanted, and are cached again with them"""
+        found = {}
+        wanted = set(keys)
+        column = "changes" if changes else "counts"
+        ids = sorted(set(rowid(key) for key in keys))
+        for i in range(0, len(ids), LOOKUP_KEYS):
+            batch = ids[i:i + LOOKUP_KEYS]
+            query = "SELECT key, text, " + column + " FROM records WHERE id IN (" + ",".join("?" * len(batch)) + ")"
+            for key, text, changed in self.db.execute(query, batch):
+                # a record whose rowid matches but whose key doesn't is another record, so isn't found
+                if key in wanted and changed is not None:
+                    found[key] = (text, changed)
+        self.used.update(rowid(key) for key in found)
+        hits = sum(1 for key in keys if key in found)
+        self.hits = self.hits + hits
+        self.misses = self.misses + len(keys) - hits
+        return found
+
+    def store(self, entries):
+        """cache a list of (key, text, changes, counts)"""
+        if self.readonly:
+            return
+        self.db.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                            [(rowid(key), key, self.config, text, counts, changes)
+                             for key, text, changes, counts in entries])
+        self.used.update(rowid(entry[0]) for entry in entries)
+
+    def prune(self):
+        """forget the records of these options that weren't used by this run"""
+        if self.readonly:
+            return
+        unused = [(id,) for id, in self.db.execute("SELECT id FROM records WHERE config = ?", (self.config,))
+                  if id not in self.used]
+        self.db.executemany("DELETE FROM records WHERE id = ?", unused)
+
+    def commit(self):
+        if not self.readonly:
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class CountingLog(ChangeLog):
+    """keeps the changes made to the records being cached for a run whose log only counts them, without counting them
+    as they are only counted once each record is done"""
+
+    def __init__(self):
+        ChangeLog.__init__(self, quiet=True)
+        self.changes = []
+
+    def delete(self, option, line):
+        self.changes.append(("delete", option, line))
+
+    def update(self, option, before, after):
+        self.changes.append(("update", option, list(before), list(after)))
+
+
+################
+## FUNCTIONS ###
+################
+
+def rowid(key):
+    """the rowid of the record with key"""
+    return int.from_bytes(key[:8], "big", signed=True)
+
+
+def iterrecordtexts(infile, size=BATCH_SIZE):
+    """split a GEDCOM file into the text of each of its level 0 records, reading size characters at a time.  Yields the
+    line number of the 1st line of each record and its text"""
+    lineno = 1
+    record = ""
+    tail = ""
+    while True:
+        data = infile.read(size)
+        if data == "":
+            break
+
+        # only whole lines are split up, the rest of the last line waits for the next read
+        text = tail + data
+        end = text.rfind("\n") + 1
+        tail = text[end:]
+        start = 0
+        for position in findrecordstarts(text, 0, end):
+            if position == 0 and record == "":
+                continue
+            record = record + text[start:position]
+            yield lineno, record
+            lineno = lineno + record.count("\n")
+            record = ""
+            start = position
+        record = record + text[start:end]
+
+    # the last line may not end in a newline
+    if tail != "" and record != "" and isrecordstart(tail):
+        yield lineno, record
+        lineno = lineno + record.count("\n")
+        record = ""
+    record = record + tail
+    if record != "":
+        yield lineno, record
+
+
+def splitlines(text):
+    """split text into lines at its newlines only, as reading a file line by line does"""
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last != "":
+        lines.append(last)
+    return lines
+
+
+def packline(line, start):
+    return [line.text, line.lineno - start, line.level, line.tag]
+
+
+def unpackline(packed, start):
+    return GedcomLine(packed[0], start + packed[1], packed[2], tag=packed[3])
+
+
+def packchanges(changes, start):
+    """encode the changes made to a record as JSON, with line numbers relative to its 1st line"""
+    packed = []
+    for change in changes:
+        if change[0] == "delete":
+            packed.append(["delete", change[1], packline(change[2], start)])
+        else:
+            packed.append(["update", change[1], [packline(line, start) for line in change[2]],
+                           [packline(line, start) for line in change[3]]])
+    return json.dumps(packed, separators=(",", ":"))
+
+
+@functools.lru_cache(maxsize=1024)
+def encodecounts(counts):
+    return json.dumps([list(count) for count in counts], separators=(",", ":"))
+
+
+def countchanges(changes):
+    """encode the number of lines each option deleted, updated & changed in a record as JSON.  Most records have the
+    same few counts, so each is only encoded once"""
+    counts = {}
+    for change in changes:
+        count = counts.get(change[1])
+        if count is None:
+            count = counts[change[1]] = [change[1], 0, 0, 0]
+        if change[0] == "delete":
+            count[1] += 1
+            count[3] += 1
+        else:
+            count[2] += 1
+            count[3] += len(change[2])
+    return encodecounts(tuple(tuple(count) for count in counts.values()))
+
+
+def replaychanges(changes, start, log):
+    """report the cached changes of a record starting at line start to log"""
+    for change in json.loads(changes):
+        if change[0] == "delete":
+            log.delete(change[1], unpackline(change[2], start))
+        else:
+            log.update(change[1], [unpackline(line, start) for line in change[2]],
+                       [unpackline(line, start) for line in change[3]])
+
+
+def addcounts(tally, log):
+    """add the counts of records to a ChangeLog that only counts.  tally is how many records had each of the counts"""
+    for counts, records in tally.items():
+        for option, deleted, updated, changed in json.loads(counts):
+            log.deleted = log.deleted + deleted * records
+            log.updated = log.updated + updated * records
+            log.counts[option, "deleted"] += deleted * records
+            log.counts[option, "updated"] += updated * records
+            log.changed[option] += changed * records
+
+
+def scrubrecords(records, options, link_option, parent_dir, log, meters=None):
+    """scrub the records of a batch that weren't in the cache, keeping their changes in log.  Returns the scrubbed text
+    & changes of each"""
+    # the records are scrubbed in one pass.  The options only look at a record at a time & every line they write or
+    # change keeps the number of a line of its record, so the output & changes can be split back up by line number
+    stages = buildpipeline(options, link_option=link_option, parent_dir=parent_dir, log=log)
+    starts = [lineno for lineno, text in records]
+    outputs = [[] for record in records]
+    changes = [[] for record in records]
+
+    def scrubbed():
+        for lineno, text in records:
+            yield from parselines(splitlines(text), lineno)
+
+    # the lines come out in the order of the records, so each only has to be checked against the start of the next.
+    # The changes don't, as a stage may report a change after the stage before it has moved on to the next record
+    starts.append(float("inf"))
+    i = 0
+    for line in chainstages(scrubbed(), stages, meters):
+        while line.lineno >= starts[i + 1]:
+            i = i + 1
+        outputs[i].append(line.text)
+    for change in log.changes:
+        lineno = change[2].lineno if change[0] == "delete" else change[2][0].lineno
+        changes[bisect.bisect_right(starts, lineno) - 1].append(change)
+    return [("".join(output), changed) for output, changed in zip(outputs, changes)]
+
+
+def iterbatches(infile, size=BATCH_SIZE):
+    """group the records of a GEDCOM file into batches of about size characters"""
+    batch = []
+    length = 0
+    for lineno, text in iterrecordtexts(infile, size):
+        batch.append((lineno, text))
+        length = length + len(text)
+        if length >= size:
+            yield batch
+            batch = []
+            length = 0
+    if len(batch) > 0:
+        yield batch
+
+
+def runcached(infile, outfile, options, cache, link_option='1', parent_dir='', log=None, meters=None):
+    """run the pipeline of the given options over infile, reusing the scrubbed text of every record already in the
+    cache and only scrubbing the records that are new or changed.  The output and the changes reported to log are the
+    same as runpipeline(), except that the changes are reported a record at a time.  Only the records that were
+    scrubbed go through the meters"""
+    if log is None:
+        log = ChangeLog()
+    if not all(option in RECORD_OPTIONS for option in options):
+        raise ValueError("only " + ", ".join(RECORD_OPTIONS) + " can be cached")
+    buildpipeline(options, link_option=link_option, parent_dir=parent_dir, log=log)
+    cache.configure(options, link_option)
+
+    # a log that only counts doesn't need each change of the cached records, just how many there were of each
+    counting = type(log) is ChangeLog and log.quiet and log.writer is None
+    tally = collections.Counter()
+
+    for batch in iterbatches(infile):
+        keys = [cache.key(text) for lineno, text in batch]
+        found = cache.lookup(keys, changes=not counting)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        scrubbed = {}
+        if len(missing) > 0:
+            results = scrubrecords([batch[i] for i in missing], options, link_option, parent_dir,
+                                   CountingLog() if counting else RecordingLog(), meters)
+            entries = []
+            # the changes are cached even by a run that only counts them, so a later run that reports every change
+            # finds the records too
+            for i, (text, changes) in zip(missing, results):
+                counts = countchanges(changes)
+                scrubbed[i] = (text, counts) if counting else (text, changes)
+                entries.append((keys[i], text, packchanges(changes, batch[i][0]), counts))
+            cache.store(entries)
+
+        # the records are written, and their changes reported, in the order they were read
+        output = []
+        for i, (lineno, text) in enumerate(batch):
+            if i in scrubbed:
+                text, changes = scrubbed[i]
+            else:
+                text, changes = found[keys[i]]
+            output.append(text)
+            if counting:
+                tally[changes] += 1
+            elif i in scrubbed:
+                RecordingLog.replay(changes, log)
+            elif changes != "[]":
+                replaychanges(changes, lineno, log)
+        outfile.write("".join(output))
+
+    addcounts(tally, log)
+    cache.prune()
+    cache.commit()
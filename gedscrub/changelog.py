@@ -0,0 +1,188 @@
+"""reporting the changes the scrubbing options make"""
+
+import collections
+import csv
+import json
+
+
+# size of the write buffer of a change log file
+CHANGELOG_BUFFER = 1 << 20
+
+
+################
+### CLASSES ####
+################
+
+class ChangeWriter(object):
+    """writes every change to a JSON lines or CSV change log file through a large write buffer"""
+    FIELDS = ("line", "option", "action", "before", "after")
+
+    def __init__(self, path, format=None):
+        # the format follows the extension of the file unless it is given
+        if format is None:
+            format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        if format not in ("jsonl", "csv"):
+            raise ValueError("unknown change log format " + str(format))
+        self.format = format
+        self.file = open(path, 'w', newline='', buffering=CHANGELOG_BUFFER)
+        if self.format == "csv":
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(self.FIELDS)
+
+    def write(self, lineno, option, action, before, after):
+        """write one change.  before & after are the text of the lines, one after another"""
+        if self.format == "csv":
+            self.csv.writerow((lineno, option, action, before, after))
+        else:
+            self.file.write(json.dumps({"line": lineno, "option": option, "action": action, "before": before,
+                                        "after": after}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ChangeLog(object):
+    """receives every change made by the scrubbing options, printing each one unless quiet, writing it to the change
+    log file if there is one and counting them for each option"""
+
+    def __init__(self, quiet=False, writer=None):
+        self.quiet = quiet
+        self.writer = writer
+        self.deleted = 0
+        self.updated = 0
+        self.counts = collections.Counter()
+        self.changed = collections.Counter()
+
+    def delete(self, option, line):
+        """line was deleted by option"""
+        self.deleted = self.deleted + 1
+        self.counts[option, "deleted"] += 1
+        self.changed[option] += 1
+        if self.writer is not None:
+            self.writer.write(line.lineno, option, "delete", line.text, "")
+        if not self.quiet:
+            print("deleting line " + str(line.lineno) + ": " + line.text, end='')
+            if not line.text.endswith("\n"):
+                print("")
+
+    def update(self, option, before, after):
+        """the list of lines before was replaced by the list of lines after by option"""
+        self.updated = self.updated + 1
+        self.counts[option, "updated"] += 1
+        self.changed[option] += len(before)
+        if self.writer is not None:
+            self.writer.write(before[0].lineno, option, "update", "".join(line.text for line in before),
+                              "".join(line.text for line in after))
+        if self.quiet:
+            return
+
+        # a single line is printed on the from & to lines, multiple lines are printed one per line below them
+        if len(before) == 1 and len(after) == 1:
+            print("updating line " + str(before[0].lineno) + "\n\tfrom: " + before[0].text, end='')
+            if not before[0].text.endswith("\n"):
+                print("")
+            print("\tto:   " + after[0].text, end='')
+        else:
+            print("updating line " + str(before[0].lineno) + "\n\tfrom:\t" + before[0].text, end='')
+            for line in before[1:]:
+                print("\t\t" + line.text, end='')
+            if not before[-1].text.endswith("\n"):
+                print("")
+            print("\tto:\t" + after[0].text, end='')
+            for line in after[1:]:
+                print("\t\t" + line.text, end='')
+        if not after[-1].text.endswith("\n"):
+            print("")
+
+    def printsummary(self):
+        """print the number of lines each option deleted & updated and the totals"""
+        for option in sorted(set(option for option, action in self.counts)):
+            print(option + ": " + str(self.counts[option, "deleted"]) + " lines deleted, " +
+                  str(self.counts[option, "updated"]) + " updated")
+        print("total: " + str(self.deleted) + " lines deleted, " + str(self.updated) + " updated")
+
+    def close(self):
+        """flush & close the change log file"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class RecordingLog(ChangeLog):
+    """keeps every change instead of printing it, so a worker process can send them back to be replayed in order"""
+
+    def __init__(self):
+        ChangeLog.__init__(self, quiet=True)
+        self.changes = []
+
+    def delete(self, option, line):
+        ChangeLog.delete(self, option, line)
+        self.changes.append(("delete", option, line))
+
+    def update(self, option, before, after):
+        ChangeLog.update(self, option, before, after)
+        self.changes.append(("update", option, list(before), list(after)))
+
+    @staticmethod
+    def replay(changes, log):
+        """report the recorded changes to log"""
+        for change in changes:
+            if change[0] == "delete":
+                log.delete(change[1], change[2])
+            else:
+                log.update(change[1], change[2], change[3])
+
+
+class StatsLog(ChangeLog):
+    """counts what every option would change for a dry run: the lines deleted, converted in place and reflowed into a
+    different number of lines, the bytes saved and the tags affected"""
+
+    TOP_TAGS = 5
+
+    def __init__(self, writer=None):
+        ChangeLog.__init__(self, quiet=True, writer=writer)
+        self.stats = {}
+
+    def option(self, option):
+        """return the statistics of option, creating them the first time it changes anything"""
+        if option not in self.stats:
+            self.stats[option] = {"deleted": 0, "converted": 0, "reflowed": 0, "bytes_saved": 0,
+                                  "tags": collections.Counter()}
+        return self.stats[option]
+
+    def delete(self, option, line):
+        ChangeLog.delete(self, option, line)
+        stats = self.option(option)
+        stats["deleted"] += 1
+        stats["bytes_saved"] += len(line.text.encode("utf-8"))
+        stats["tags"][line.tag or "(illegal)"] += 1
+
+    def update(self, option, before, after):
+        ChangeLog.update(self, option, before, after)
+        stats = self.option(option)
+        if len(before) == len(after):
+            stats["converted"] += len(before)
+        else:
+            stats["reflowed"] += len(before)
+        stats["bytes_saved"] += (sum(len(line.text.encode("utf-8")) for line in before) -
+                                 sum(len(line.text.encode("utf-8")) for line in after))
+        stats["tags"][before[0].tag or "(illegal)"] += 1
+
+    def merge(self, stats):
+        """add the statistics of another StatsLog, ie: from a batch worker"""
+        for option, other in stats.items():
+            mine = self.option(option)
+            for key in ("deleted", "converted", "reflowed", "bytes_saved"):
+                mine[key] += other[key]
+            mine["tags"].update(other["tags"])
+
+    def printstats(self):
+        """print the statistics of each option"""
+        if len(self.stats) == 0:
+            print("no lines would be changed")
+        for option in sorted(self.stats):
+            stats = self.stats[option]
+            print(option + ": " + str(stats["deleted"]) + " lines deleted, " + str(stats["converted"]) + " converted, " +
+                  str(stats["reflowed"]) + " reflowed, " + str(stats["bytes_saved"]) + " bytes saved")
+            print("\ttop tags: " + ", ".join(tag + " (" + str(count) + ")"
+                                             for tag, count in stats["tags"].most_common(self.TOP_TAGS)))
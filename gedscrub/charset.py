@@ -0,0 +1,327 @@
+"""picking the character set of a GEDCOM file from its byte order mark & its 1 CHAR line, and an ANSEL codec, so files
+are transcoded as they are read & written rather than in a pass of their own"""
+
+import codecs
+import functools
+import io
+import locale
+import re
+import unicodedata
+
+from gedscrub.archive import compression, openreader, openwriter
+from gedscrub.gedcom import parseline, replacevalue, makeline
+
+# REFERENCES
+# https://www.loc.gov/marc/specifications/specchareacc.html
+# https://www.gedcom.org/gedcom.html (GEDCOM 5.5.1, ANSEL & the CHAR tag)
+
+
+# bytes at the start of a file read to pick its character set.  The HEAD record, with its CHAR line, comes 1st
+SNIFF_BYTES = 1 << 16
+
+# bytes read & decoded from an input file at a time
+TRANSCODE_CHUNK = 1 << 16
+
+# Python codecs of the character sets a GEDCOM 1 CHAR line may name.  ASCII is a subset of UTF-8, and files that
+# claim to be ASCII but aren't are almost always UTF-8
+GEDCOM_CODECS = {
+    "ANSEL": "ansel",
+    "UTF-8": "utf-8",
+    "UTF8": "utf-8",
+    "UNICODE": "utf-16",
+    "ASCII": "utf-8",
+    "ANSI": "cp1252",
+    "IBM WINDOWS": "cp1252",
+    "IBMPC": "cp437",
+    "MACINTOSH": "mac-roman",
+}
+
+# the 1 CHAR line written for output in each codec
+CODEC_CHARSETS = {
+    "ansel": "ANSEL",
+    "utf-8": "UTF-8",
+    "utf-8-sig": "UTF-8",
+    "utf-16": "UNICODE",
+    "utf-16-le": "UNICODE",
+    "utf-16-be": "UNICODE",
+    "ascii": "ASCII",
+    "cp1252": "ANSI",
+}
+
+# the ANSEL (ANSI/NISO Z39.47) characters above ASCII, including the GEDCOM additions at 0xBE, 0xBF & 0xCF
+ANSEL_CHARACTERS = {
+    0xA1: "Ł", 0xA2: "Ø", 0xA3: "Đ", 0xA4: "Þ", 0xA5: "Æ", 0xA6: "Œ", 0xA7: "ʹ",
+    0xA8: "·", 0xA9: "♭", 0xAA: "®", 0xAB: "±", 0xAC: "Ơ", 0xAD: "Ư", 0xAE: "ʼ",
+    0xB0: "ʻ", 0xB1: "ł", 0xB2: "ø", 0xB3: "đ", 0xB4: "þ", 0xB5: "æ", 0xB6: "œ",
+    0xB7: "ʺ", 0xB8: "ı", 0xB9: "£", 0xBA: "ð", 0xBC: "ơ", 0xBD: "ư", 0xBE: "□",
+    0xBF: "■", 0xC0: "°", 0xC1: "ℓ", 0xC2: "℗", 0xC3: "©", 0xC4: "♯", 0xC5: "¿",
+    0xC6: "¡", 0xC7: "ß", 0xC8: "€", 0xCF: "ß",
+}
+
+# the ANSEL combining diacritics.  In ANSEL they come before the letter they go on, in Unicode after it
+ANSEL_MARKS = {
+    0xE0: "\u0309", 0xE1: "\u0300", 0xE2: "\u0301", 0xE3: "\u0302", 0xE4: "\u0303", 0xE5: "\u0304", 0xE6: "\u0306",
+    0xE7: "\u0307", 0xE8: "\u0308", 0xE9: "\u030c", 0xEA: "\u030a", 0xEB: "\ufe20", 0xEC: "\ufe21", 0xED: "\u0315",
+    0xEE: "\u030b", 0xEF: "\u0310", 0xF0: "\u0327", 0xF1: "\u0328", 0xF2: "\u0323", 0xF3: "\u0324", 0xF4: "\u0325",
+    0xF5: "\u0333", 0xF6: "\u0332", 0xF7: "\u0326", 0xF8: "\u031c", 0xF9: "\u032e", 0xFA: "\ufe22", 0xFB: "\ufe23",
+    0xFE: "\u0313",
+}
+
+# ANSEL bytes are decoded as Latin-1 characters first, then reordered & translated to Unicode.  GEDCOM writes ß as 0xCF
+ANSEL_DECODE = str.maketrans({chr(byte): character for byte, character in
+                              list(ANSEL_CHARACTERS.items()) + list(ANSEL_MARKS.items())})
+ANSEL_ENCODE = str.maketrans({character: chr(byte) for byte, character in
+                              list(ANSEL_CHARACTERS.items()) + list(ANSEL_MARKS.items()) if byte != 0xC7})
+MARK_BYTES = "".join(chr(byte) for byte in ANSEL_MARKS)
+MARK_CHARACTERS = "".join(ANSEL_MARKS.values())
+ANSEL_UNDEFINED = re.compile("[^\x00-\x7f" + "".join(chr(byte) for byte in ANSEL_CHARACTERS) + MARK_BYTES + "]")
+ANSEL_UNENCODABLE = re.compile("[^\x00-\x7f" + "".join(ANSEL_CHARACTERS.values()) + MARK_CHARACTERS + "]")
+ANSEL_TRAILING_MARKS = re.compile("[" + MARK_BYTES + "]+$")
+MARKS_BEFORE = re.compile("([" + MARK_BYTES + "]+)([^\x00-\x1f" + MARK_BYTES + "])")
+MARKS_AFTER = re.compile("([^\x00-\x1f" + MARK_CHARACTERS + "])([" + MARK_CHARACTERS + "]+)")
+
+# ANSEL has the letters with a horn as characters of their own rather than a diacritic
+HORNS = {"O\u031b": "Ơ", "o\u031b": "ơ", "U\u031b": "Ư", "u\u031b": "ư"}
+HORN = re.compile("[OoUu]\u031b")
+
+# the CHAR line of the header, and the start of the record after it
+HEAD_CHAR = re.compile(r'^[ \t]*1[ \t]+CHAR[ \t]+([^\r\n]*)', re.MULTILINE)
+NEXT_RECORD = re.compile(r'[\r\n][ \t]*0[ \t]')
+
+
+################
+### CLASSES ####
+################
+
+class AnselIncrementalEncoder(codecs.IncrementalEncoder):
+    """encodes ANSEL as it's written.  A letter & the diacritics on it are expected in the same write, which they
+    always are as every line is written whole"""
+
+    def encode(self, input, final=False):
+        return anselencode(input, self.errors)[0]
+
+
+class AnselIncrementalDecoder(codecs.BufferedIncrementalDecoder):
+    """decodes ANSEL as it's read, holding back diacritics at the end of a chunk until the letter they go on arrives"""
+
+    def _buffer_decode(self, input, errors, final):
+        return anseldecode(input, errors, final)
+
+
+class CharsetWriter(object):
+    """an output file that rewrites the 1 CHAR line of the header to the character set the output is written in"""
+
+    def __init__(self, stream, charset):
+        self.stream = stream
+        self.charset = charset
+        self.done = charset is None
+        self.inhead = False
+        self.found = False
+
+    def rewrite(self, text):
+        """rewrite the CHAR line if it's in text, which must hold whole lines.  A header without one gets one"""
+        output = []
+        lines = text.splitlines(keepends=True)
+        for i, data in enumerate(lines):
+            line = parseline(data, 0)
+            if line.level == 0:
+                if line.tag == "HEAD" and not self.inhead:
+                    self.inhead = True
+                    output.append(data)
+                    continue
+                if self.inhead and not self.found:
+                    output.append(makeline(1, "CHAR", self.charset).text)
+                self.done = True
+                return "".join(output + lines[i:])
+            if self.inhead and line.level == 1 and line.tag == "CHAR":
+                self.found = True
+                data = replacevalue(line, self.charset).text
+            output.append(data)
+        return "".join(output)
+
+    def write(self, text):
+        if not self.done:
+            text = self.rewrite(text)
+        return self.stream.write(text)
+
+    def writelines(self, lines):
+        lines = iter(lines)
+        for text in lines:
+            if self.done:
+                self.stream.write(text)
+                break
+            self.stream.write(self.rewrite(text))
+        self.stream.writelines(lines)
+
+
+################
+## FUNCTIONS ###
+################
+
+def anseldecode(data, errors='strict', final=True):
+    """decode ANSEL bytes, returning the text and the number of bytes used.  Diacritics at the end are left for the
+    next call unless final.  Letters & their diacritics are combined into single characters where Unicode has them"""
+    text = bytes(data).decode("latin-1")
+    if not final:
+        match = ANSEL_TRAILING_MARKS.search(text)
+        if match is not None:
+            text = text[:match.start()]
+    consumed = len(text)
+    if text.isascii():
+        return text, consumed
+
+    # undefined bytes are handled the way errors says, decoding fails by default
+    if ANSEL_UNDEFINED.search(text) is not None:
+        handler = codecs.lookup_error(errors)
+        parts = []
+        position = 0
+        for match in ANSEL_UNDEFINED.finditer(text):
+            parts.append(text[position:match.start()])
+            replacement, position = handler(UnicodeDecodeError("ansel", bytes(data), match.start(), match.end(),
+                                                               "undefined ANSEL byte"))
+            parts.append(replacement)
+        parts.append(text[position:])
+        text = "".join(parts)
+
+    text = MARKS_BEFORE.sub(lambda match: match.group(2) + match.group(1), text).translate(ANSEL_DECODE)
+    return unicodedata.normalize("NFC", text), consumed
+
+
+def anselencode(text, errors='strict'):
+    """encode text as ANSEL, returning the bytes and the number of characters used"""
+    if text.isascii():
+        return text.encode("ascii"), len(text)
+
+    # letters are split from their diacritics, which go in front of them
+    decomposed = HORN.sub(lambda match: HORNS[match.group(0)], unicodedata.normalize("NFD", text))
+    decomposed = MARKS_AFTER.sub(lambda match: match.group(2) + match.group(1), decomposed)
+
+    # characters ANSEL doesn't have are handled the way errors says, encoding fails by default
+    if ANSEL_UNENCODABLE.search(decomposed) is not None:
+        handler = codecs.lookup_error(errors)
+        parts = []
+        position = 0
+        for match in ANSEL_UNENCODABLE.finditer(decomposed):
+            parts.append(decomposed[position:match.start()])
+            replacement, position = handler(UnicodeEncodeError("ansel", decomposed, match.start(), match.end(),
+                                                               "character not in ANSEL"))
+            if isinstance(replacement, bytes):
+                replacement = replacement.decode("latin-1")
+            parts.append(replacement)
+        parts.append(decomposed[position:])
+        decomposed = "".join(parts)
+
+    return decomposed.translate(ANSEL_ENCODE).encode("latin-1"), len(text)
+
+
+def searchcodec(name):
+    """find the ANSEL codec by name, for codecs.register()"""
+    if name not in ("ansel", "z39_47"):
+        return None
+    return codecs.CodecInfo(name="ansel", encode=anselencode, decode=lambda data, errors='strict':
+                            anseldecode(data, errors), incrementalencoder=AnselIncrementalEncoder,
+                            incrementaldecoder=AnselIncrementalDecoder)
+
+
+@functools.lru_cache(maxsize=None)
+def registeransel():
+    """register the ANSEL codec with Python, once.  It's registered the first time a character set is looked up rather
+    than when gedscrub is imported, so importing it doesn't change anything"""
+    codecs.register(searchcodec)
+
+
+def codecname(name):
+    """return the Python codec of a character set given by its GEDCOM name (ANSEL, UNICODE, etc) or codec name"""
+    registeransel()
+    if name.strip().upper() in GEDCOM_CODECS:
+        return GEDCOM_CODECS[name.strip().upper()]
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        raise ValueError("unknown character set " + name)
+
+
+def gedcomcharset(encoding):
+    """the name the 1 CHAR line gives the character set of encoding, or None if GEDCOM has no name for it"""
+    return CODEC_CHARSETS.get(codecname(encoding))
+
+
+def relabel(outfile, encoding=None):
+    """return outfile, rewriting the 1 CHAR line written to it to name encoding if it is given"""
+    if encoding is None:
+        return outfile
+    return CharsetWriter(outfile, gedcomcharset(encoding))
+
+
+def detectencoding(data):
+    """pick the codec of a GEDCOM file from the bytes at its start.  A byte order mark decides, then the NUL bytes of
+    UTF-16 without one, then the 1 CHAR line of the header.  Otherwise it's the platform's default"""
+    if data.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    if data[:1] != b"\x00" and data[1:2] == b"\x00":
+        return "utf-16-le"
+    if data[:1] == b"\x00" and data[1:2] != b"\x00":
+        return "utf-16-be"
+
+    # only the header's lines are looked at, and they're all ASCII
+    text = data.decode("latin-1")
+    match = NEXT_RECORD.search(text)
+    if match is not None:
+        text = text[:match.start()]
+    match = HEAD_CHAR.search(text)
+    if match is not None:
+        try:
+            codec = codecname(match.group(1).strip())
+            if not codec.startswith("utf-16"):
+                return codec
+        except ValueError:
+            pass
+    return codecs.lookup(locale.getpreferredencoding(False)).name
+
+
+def sniffencoding(path):
+    """pick the codec of the GEDCOM file at path, decompressing it if it is compressed"""
+    kind = compression(path)
+    with (open(path, 'rb') if kind is None else openreader(path, kind)) as infile:
+        return detectencoding(infile.read(SNIFF_BYTES))
+
+
+def inputencoding(path, encoding=None):
+    """the codec the GEDCOM file at path is read in: encoding if it's given, otherwise picked from the file"""
+    if encoding is None:
+        return sniffencoding(path)
+    return codecname(encoding)
+
+
+def openinput(path, encoding=None):
+    """open a GEDCOM file for reading in its own character set, or in encoding if it's given.  It's decompressed if
+    it's compressed and decoded a large chunk at a time as it's read"""
+    kind = compression(path)
+    if kind is None:
+        binary = open(path, 'rb', buffering=TRANSCODE_CHUNK)
+    else:
+        binary = io.BufferedReader(openreader(path, kind), TRANSCODE_CHUNK)
+
+    # the character set is picked from the start of the (decompressed) bytes without reading them twice
+    try:
+        if encoding is None:
+            encoding = detectencoding(binary.peek(SNIFF_BYTES))
+        return io.TextIOWrapper(binary, encoding=codecname(encoding))
+    except BaseException:
+        binary.close()
+        raise
+
+
+def openoutput(path, encoding=None, source=None):
+    """open a GEDCOM file for writing in encoding, the platform's default if it isn't given.  It's compressed if its
+    extension is .gz or .zst, and written into a zip archive along with the media of source if it's .zip or .gdz"""
+    encoding = None if encoding is None else codecname(encoding)
+    kind = compression(path, 'w')
+    if kind is None:
+        return open(path, 'w', encoding=encoding)
+    binary = openwriter(path, kind, source)
+    if kind == "zip":
+        binary = io.BufferedWriter(binary, TRANSCODE_CHUNK)
+    return io.TextIOWrapper(binary, encoding=encoding)
@@ -0,0 +1,623 @@
+"""the gedscrub command line: the interactive menu and the non-interactive arguments"""
+
+import argparse
+import contextlib
+import os
+import sys
+
+from gedscrub import __version__
+from gedscrub.api import updatelinks, deletecustomtags, deleteUPDtags, updateUPDtoNOTEtags, deleteAPIDtags, \
+    updateAPIDtoNOTEtags, updatecustomtagstoNOTE, cleanNewLines, deleteHTML
+from gedscrub.batch import loadmanifest, findbatch, makechangelog, runjob, runbatch
+from gedscrub.changelog import ChangeLog, StatsLog
+from gedscrub.charset import openinput, openoutput
+from gedscrub.index import INDEX_SUFFIX, buildindex, indexpath
+from gedscrub.media import MAX_DOWNLOADS, downloadimages
+from gedscrub.metrics import RunMetrics, writemetrics
+from gedscrub.ops import MEMO_SIZE
+from gedscrub.pipeline import PIPELINE_OPTIONS, buildpipeline, runpipeline
+
+# REFERENCES
+# https://stackoverflow.com/questions/5637124/tab-completion-in-pythons-raw-input
+# http://schdbr.de/python-readline-path-completion/
+
+
+################
+### CLASSES ####
+################
+
+class Completer(object):
+    # REFERENCES
+    # https://stackoverflow.com/questions/5637124/tab-completion-in-pythons-raw-input
+    # http://schdbr.de/python-readline-path-completion/
+
+    def _listdir(self, path):
+        """list directory contents"""
+
+        # get directory listing
+        if path.startswith(os.path.sep):
+            # absolute path
+            basedir = os.path.dirname(path)
+            contents = os.listdir(basedir)
+            # add back the parent
+            contents = [os.path.join(basedir, d) for d in contents]
+        else:
+            # relative path
+            contents = os.listdir(os.curdir)
+
+        # add trailing slash to directories
+        # contents = [d + os.path.sep for d in contents if os.path.isdir(d)]
+        for i in range(len(contents)):
+            if os.path.isdir(contents[i]):
+                contents[i] = contents[i] + os.path.sep
+            else:
+                contents[i] = contents[i]
+        return contents
+
+    def completer(self, text, state):
+        """return elements of directory list that start with the entered text"""
+        options = [x for x in self._listdir(text) if x.startswith(text)]
+        return options[state]
+
+
+################
+## FUNCTIONS ###
+################
+
+def parseargs():
+    """Function to parse command line arguments"""
+    parser = argparse.ArgumentParser(prog='gedscrub',
+                                     description='Tool to scrub a GEDCOM (Genealogy Data Communication) file to clean '
+                                                 'up and modify its contents.')
+    parser.add_argument("-v", "--verbose", help="increase verbosity of output", action="store_true")
+    parser.add_argument("-i", "--input", help="input GEDCOM file to scrub, which may be compressed with gzip or zstd "
+                                              "or in a zip archive", type=str)
+    parser.add_argument("-o", "--output", help="output GEDCOM file to create.  It's compressed if it ends in .gz or "
+                                               ".zst, and a zip archive with the media of a zip input if it ends in "
+                                               ".zip or .gdz", type=str)
+    parser.add_argument("-p", "--ops", help="scrubbing options to apply without prompting, in order (ie: g5 g6 m2 a1)",
+                        nargs="+", metavar="OPTION")
+    parser.add_argument("-m", "--manifest", help="JSON or TOML job manifest listing the files to scrub without "
+                                                 "prompting", type=str)
+    parser.add_argument("--link-option", help="what g6 does with \"<a href=\" type hyperlink tags.  1: delete them, "
+                                              "2: leave them alone, 3: convert them to non-markup text",
+                        choices=["1", "2", "3"])
+    parser.add_argument("--parent-dir", help="parent directory of downloaded files for g2", type=str)
+    parser.add_argument("--download-dir", help="parent directory to download files to for g1", type=str)
+    parser.add_argument("--max-downloads", help="number of files g1 downloads at once (default: " +
+                                                str(MAX_DOWNLOADS) + ")", type=int)
+    parser.add_argument("--overwrite", help="replace output files that already exist", action="store_true")
+    parser.add_argument("-q", "--quiet", help="print only the number of lines each option deleted & updated instead "
+                                              "of every change", action="store_true")
+    parser.add_argument("--changelog", help="file to write every change to, as JSON lines or as CSV if it ends in "
+                                            ".csv.  A batch writes one file per GEDCOM file to this directory",
+                        type=str)
+    parser.add_argument("-n", "--dry-run", help="count what the options would change without writing any output",
+                        action="store_true")
+    parser.add_argument("--stats", help="file to write the metrics of each job to as a line of JSON: the wall & CPU "
+                                        "time, lines in & out, lines changed and throughput of each option, and the "
+                                        "bytes read & written and peak memory of the run.  - writes to standard "
+                                        "output", type=str, metavar="PATH")
+    parser.add_argument("--changelog-format", help="format of the change log files (default: from the extension, "
+                                                   "otherwise jsonl)", choices=["jsonl", "csv"])
+    parser.add_argument("--encoding", help="character set to read the input in, by its GEDCOM name (ANSEL, UNICODE, "
+                                           "UTF-8, ASCII) or Python codec (default: from the byte order mark or the "
+                                           "1 CHAR line of the header)", type=str, metavar="CHARSET")
+    parser.add_argument("--output-encoding", help="character set to write the output in, rewriting its 1 CHAR line "
+                                                  "to match (default: the input's)", type=str, metavar="CHARSET")
+    parser.add_argument("-r", "--records", help="scrub only these records of the input, by xref (ie: @I1234@) or by "
+                                              "record type (ie: SOUR), finding them through the index of the file",
+                        nargs="+", metavar="RECORD")
+    parser.add_argument("--index", help="index file of the input's records (default: the input's path with " +
+                                        INDEX_SUFFIX + " added)", type=str)
+    parser.add_argument("--build-index", help="index the records of the input and write the index file, without "
+                                              "scrubbing", action="store_true")
+    parser.add_argument("--cache", help="SQLite file caching the scrubbed records of the input, so the next run only "
+                                        "scrubs the records that are new or changed.  A batch keeps one file per "
+                                        "GEDCOM file in this directory", type=str, metavar="PATH")
+    parser.add_argument("--memo-size", help="number of distinct values g6 remembers the cleaned form of, so values "
+                                            "repeated throughout a file are only cleaned once.  0 turns it off "
+                                            "(default: " + str(MEMO_SIZE) + ")", type=int, metavar="VALUES")
+    parser.add_argument("-b", "--batch", help="directory or glob pattern of GEDCOM files to scrub without prompting",
+                        type=str)
+    parser.add_argument("--output-dir", help="directory to write the scrubbed files of a batch to", type=str)
+    parser.add_argument("--serve", help="stay running and scrub the jobs sent to this Unix domain socket, one JSON "
+                                        "object per line, on --workers processes", type=str, metavar="SOCKET")
+    parser.add_argument("-j", "--workers", help="number of processes scrubbing files at once (default: number of CPUs), "
+                                               "or chunks of a single file at once (default: 1, or the number of CPUs "
+                                               "for a dry run)", type=int)
+    args = parser.parse_args()
+    if args.verbose:
+        print("verbose output is turned on")
+
+    # any of the non-interactive arguments means we never prompt, so everything a job needs has to be given
+    if args.build_index:
+        if args.input is None:
+            parser.error("--input is required to build an index")
+    elif args.batch is not None:
+        if args.ops is None or (args.output_dir is None and not args.dry_run):
+            parser.error("--ops and --output-dir are both required to scrub a batch")
+    elif args.manifest is None and (args.input is not None or args.ops is not None):
+        if args.input is None or args.ops is None:
+            parser.error("--input and --ops are both required to scrub without prompting")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.max_downloads is not None and args.max_downloads < 1:
+        parser.error("--max-downloads must be at least 1")
+    if args.memo_size is not None and args.memo_size < 0:
+        parser.error("--memo-size can't be negative")
+
+    return args
+
+
+def configautocomplete():
+    # readline is only needed to prompt, so importing gedscrub as a library doesn't load it
+    import readline
+
+    comp = Completer()
+    readline.set_completer(comp.completer)
+    if sys.platform == 'darwin':
+        # Apple
+        readline.parse_and_bind("bind -e")
+        readline.parse_and_bind("bind '\t' rl_complete")
+    else:
+        # Linux
+        readline.set_completer_delims(' \t\n`~!@# $%^&*()-=+[{]}\\|;:\'",<>?')
+        readline.parse_and_bind("tab: complete")
+
+
+def yes_or_no(question):
+    # REFERENCES
+    # https://gist.github.com/garrettdreyfus/8153571
+    # https://pymotw.com/3/urllib.parse/
+
+    """get yes or no answer from user"""
+
+    answer = input(question + " (y/n): ").lower().strip()
+    while not (answer == "y" or answer == "yes" or answer == "n" or answer == "no"):
+        print("Input yes or no")
+        answer = input(question + " (y/n):").lower().strip()
+        print("")
+    if answer[0] == "y":
+        return True
+    else:
+        return False
+
+
+def buildjobs(args):
+    """return the jobs described by the command line arguments, manifest and batch"""
+    jobs = []
+    if args.manifest is not None:
+        jobs = loadmanifest(args.manifest)
+    elif args.batch is None:
+        jobs = [{}]
+
+    # arguments given on the command line take precedence over the manifest
+    for job in jobs:
+        for key in ("input", "output", "ops", "link_option", "parent_dir", "download_dir", "max_downloads", "records",
+                    "index", "memo_size", "encoding", "output_encoding"):
+            if getattr(args, key) is not None:
+                job[key] = getattr(args, key)
+
+    # every file of a batch is written to the output directory under its own name
+    if args.batch is not None:
+        paths = findbatch(args.batch)
+        if len(paths) == 0:
+            raise ValueError("no GEDCOM files found in " + args.batch)
+        for path in paths:
+            job = {"input": path}
+            if args.output_dir is not None:
+                job["output"] = os.path.join(args.output_dir, os.path.basename(path))
+            for key in ("ops", "link_option", "parent_dir", "download_dir", "max_downloads", "records", "memo_size",
+                        "encoding", "output_encoding"):
+                if getattr(args, key) is not None:
+                    job[key] = getattr(args, key)
+            jobs.append(job)
+
+    # a single job writes its changes to the change log file, every job of a batch to its own file in that directory
+    if args.changelog is not None:
+        if len(jobs) == 1 and args.batch is None:
+            jobs[0]["changelog"] = args.changelog
+        else:
+            extension = ".csv" if args.changelog_format == "csv" else ".jsonl"
+            for job in jobs:
+                job["changelog"] = os.path.join(args.changelog, os.path.basename(str(job.get("input"))) +
+                                                ".changes" + extension)
+
+    # a cache only keeps the records of its latest run, so every file of a batch has its own
+    if args.cache is not None:
+        if len(jobs) == 1 and args.batch is None:
+            jobs[0]["cache"] = args.cache
+        else:
+            for job in jobs:
+                job["cache"] = os.path.join(args.cache, os.path.basename(str(job.get("input"))) + ".cache")
+    if args.changelog_format is not None:
+        for job in jobs:
+            job["changelog_format"] = args.changelog_format
+    if args.dry_run:
+        for job in jobs:
+            job["dry_run"] = True
+    return jobs
+
+
+def runheadless(args):
+    """run every job given on the command line, in the manifest or in the batch without prompting.  Returns the exit
+    status.  When the --stats metrics go to standard output everything else is printed to standard error, so the
+    metrics can be parsed"""
+    if args.stats != "-":
+        return scrubheadless(args)
+    stdout = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return scrubheadless(args, stdout)
+
+
+def scrubheadless(args, stdout=None):
+    """run the jobs of runheadless(), writing --stats - metrics to stdout"""
+    try:
+        jobs = buildjobs(args)
+    except (OSError, ValueError) as e:
+        print("Error: " + str(e))
+        return 1
+
+    # a single job prints each of its changes, more than one are scrubbed in parallel
+    if len(jobs) == 1 and args.batch is None:
+        try:
+            log = makechangelog(jobs[0], args.quiet)
+        except Exception as e:
+            print("Error: " + str(e))
+            return 1
+        # a dry run has no output to keep in order, so it uses every CPU unless told otherwise
+        workers = args.workers
+        if workers is None and args.dry_run:
+            workers = os.cpu_count()
+        metrics = RunMetrics() if args.stats is not None else None
+        try:
+            if metrics is not None:
+                metrics.begin()
+            runjob(jobs[0], args.overwrite, log, workers=workers, metrics=metrics)
+            if metrics is not None:
+                metrics.end()
+                writemetrics(args.stats, [metrics.record(jobs[0], log, workers)], stdout)
+        except Exception as e:
+            # a corrupt cache or archive, or a bad manifest value, is reported like a batch job's failure
+            print("Error: " + str(e))
+            return 1
+        finally:
+            log.close()
+        if isinstance(log, StatsLog):
+            log.printstats()
+        elif args.quiet:
+            log.printsummary()
+        return 0
+
+    if args.output_dir is not None and not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    if args.changelog is not None and not os.path.isdir(args.changelog):
+        os.makedirs(args.changelog)
+    if args.cache is not None and not args.dry_run and not os.path.isdir(args.cache):
+        os.makedirs(args.cache)
+    metrics = [] if args.stats is not None else None
+    failures = runbatch(jobs, args.overwrite, args.workers, args.quiet, metrics)
+    if metrics is not None:
+        try:
+            writemetrics(args.stats, metrics, stdout)
+        except OSError as e:
+            print("Error: " + str(e))
+            return 1
+    if failures > 0:
+        return 1
+    return 0
+
+
+def writeindex(args):
+    """index the records of the input file and save the index.  Returns the exit status"""
+    path = args.index if args.index is not None else indexpath(args.input)
+    try:
+        index = buildindex(args.input, args.encoding)
+        index.save(path)
+    except (OSError, ValueError) as e:
+        print("Error: " + str(e))
+        return 1
+    print(str(len(index.records)) + " records of " + args.input + " indexed in " + path)
+    return 0
+
+
+def printversioninfo():
+    print("gedscrub version: " + __version__)
+
+
+# TODO add myhertiage specific option to delete myheritage links
+
+################
+##### MAIN #####
+################
+
+def main():
+    # parse arguments
+    args = parseargs()
+
+    # serve jobs sent over a socket until told to stop
+    if args.serve is not None:
+        from gedscrub.server import serve
+        return serve(args.serve, args.workers)
+
+    # index a file without scrubbing it
+    if args.build_index:
+        return writeindex(args)
+
+    # scrub without prompting if the jobs were given on the command line
+    if args.input is not None or args.manifest is not None or args.batch is not None:
+        return runheadless(args)
+
+    # setup autocompletion
+    configautocomplete()
+
+    # quick test for input behavior.  Can delete when satisified
+    # while True:
+    #     last_string = input('? ')
+    #     print("Last input:", last_string)
+
+    # get input file
+    while True:
+        infilepath = input("Enter the path of the GEDCOM file you'd like to scrub: ")
+        if os.path.exists(infilepath):
+            break
+        else:
+            print("Error: File doesn't exist.")
+
+    option_list = ["g1", "g2", "g3", "g4", "g5", "g6", "m1", "m2", "m3", "a1", "a2", "p", "v", "q"]
+
+    while True:
+        # what does the user want to do?
+        print("")
+        print("**************************************************************************************")
+        print("*")
+        print("*** GENERAL ***")
+        print("* g1: download all FILEs")
+        print("* g2: replace FILE hyperlinks with local addresses")
+        print("* g3: delete all custom tags (prepended with an underscore ie: _UPD)")
+        print("* g4: convert all custom tags (prepended with an underscore ie: _UPD) into NOTE fields")
+        print("* g5: convert all illegal new lines (lines that don't start with a tag) to CONT lines")
+        print("* g6: delete HTML (<p>, <br />, etc) embedded in TEXT and other fields")
+        print("*")
+        print("*** MYHERITAGE.COM SPECIFIC ***")
+        print("* m1: delete all _UPD tags (myheritage.com Upload Dates)")
+        print("* m2: convert all _UPD tags (myheritage.com Upload Dates) into NOTE fields with additional info")
+        print("*")
+        print("*** ANCESTRY.COM SPECIFIC **")
+        print("* a1: delete all _APID tags (ancestry.com custom tag for source hints)")
+        print("* a2: convert all _APID tags (ancestry.com custom tag for source hints) into NOTE fields with additional"
+              " info")
+        print("*")
+        print("*** PIPELINE ***")
+        print("* p: apply several of the g2-g6, m & a options, in order, in a single pass over the file")
+        print("*")
+        print("***SYSTEM**")
+        print("* v: version")
+        print("* q: quit")
+        print("*")
+        print("**************************************************************************************")
+
+        option = ''
+        while option.lower() not in option_list:
+            option = input("Select a scrubbing option: ")
+
+        if option == "g1":  # download FILEs
+            infile = openinput(infilepath)
+
+            while True:
+                download_dir = input("Enter parent directory to download files to: ")
+                if os.path.isdir(download_dir):
+                    break
+                else:
+                    if os.path.isfile(download_dir):
+                        print("Path points to a file.  Please enter a directory.")
+                    else:
+                        os.makedirs(download_dir)
+                        break
+
+            downloadimages(infile, os.path.join(download_dir, ''))
+
+            infile.close()
+        elif option == "g2":  # update FILE links
+            parent_dir = input("Enter parent directory of downloaded files: ")
+
+            infile = openinput(infilepath)
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            updatelinks(infile, outfile, os.path.join(parent_dir, ''), ChangeLog())
+
+            infile.close()
+            outfile.close()
+        elif option == "g3":  # delete all custom tags
+            infile = openinput(infilepath)
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            deletecustomtags(infile, outfile, ChangeLog())
+
+            infile.close()
+            outfile.close()
+        elif option == "g4":  # convert all custom tags to NOTE tags
+            infile = openinput(infilepath)
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            updatecustomtagstoNOTE(infile, outfile, ChangeLog())
+
+            infile.close()
+            outfile.close()
+        elif option == "g5":  # convert illegal new lines into CONT lines
+            infile = openinput(infilepath)
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            cleanNewLines(infile, outfile, ChangeLog())
+
+            infile.close()
+            outfile.close()
+        elif option == "g6":  # delete HTML tags embedded in fields
+            infile = openinput(infilepath)
+
+            # ask what they want to do with <a href> hyperlinks
+            option2_list = ["1", "2", "3"]
+
+            option2 = ''
+            while option2.lower() not in option2_list:
+                option2 = input("What do you want to do with \"<a href=\" type hyperlink tags?\n" +
+                               "\t 1: delete them and lose the links entirely\n" +
+                               "\t 2: leave them alone\n" +
+                               "\t 3: convert them to non-markup text\n")
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            deleteHTML(infile, outfile, option2, ChangeLog())
+
+            infile.close()
+            outfile.close()
+        elif option == "m1":  # delete all _UPD tags
+            infile = openinput(infilepath)
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            deleteUPDtags(infile, outfile, ChangeLog())
+
+            infile.close()
+            outfile.close()
+        elif option == "m2":  # convert all _UPD tags to NOTE tags
+            infile = openinput(infilepath)
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            updateUPDtoNOTEtags(infile, outfile, ChangeLog())
+
+            infile.close()
+            outfile.close()
+        elif option == "a1":  # delete all _APID tags
+            infile = openinput(infilepath)
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            deleteAPIDtags(infile, outfile, ChangeLog())
+
+            infile.close()
+            outfile.close()
+        elif option == "a2":  # convert all _APID tags to NOTE tags
+            infile = openinput(infilepath)
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            updateAPIDtoNOTEtags(infile, outfile, ChangeLog())
+
+            infile.close()
+            outfile.close()
+        elif option == "p":  # apply several options in a single pass
+            # ask which options to chain together
+            while True:
+                pipeline = input("Enter the scrubbing options to apply, in order, separated by spaces "
+                                 "(ie: g5 g6 m2 a1): ")
+                pipeline = pipeline.lower().split()
+                if len(pipeline) > 0 and all(item in PIPELINE_OPTIONS for item in pipeline):
+                    break
+                else:
+                    print("Error: Choose from " + ", ".join(PIPELINE_OPTIONS) + ".")
+
+            parent_dir = ''
+            if "g2" in pipeline:
+                parent_dir = input("Enter parent directory of downloaded files: ")
+
+            option2 = ''
+            if "g6" in pipeline:
+                # ask what they want to do with <a href> hyperlinks
+                option2_list = ["1", "2", "3"]
+
+                while option2.lower() not in option2_list:
+                    option2 = input("What do you want to do with \"<a href=\" type hyperlink tags?\n" +
+                                    "\t 1: delete them and lose the links entirely\n" +
+                                    "\t 2: leave them alone\n" +
+                                    "\t 3: convert them to non-markup text\n")
+
+            infile = openinput(infilepath)
+
+            # get a path to the new output GEDCOM file
+            while True:
+                outfilepath = input("Enter the path of the new output GEDCOM file: ")
+                if not os.path.exists(outfilepath):
+                    outfile = openoutput(outfilepath, infile.encoding, infilepath)
+                    break
+                else:
+                    print("Error: File already exists.")
+
+            runpipeline(infile, outfile, buildpipeline(pipeline, link_option=option2,
+                                                       parent_dir=os.path.join(parent_dir, '')))
+
+            infile.close()
+            outfile.close()
+        elif option == "v":  # print version information
+            printversioninfo()
+        elif option == "q":  # quit
+            break
@@ -0,0 +1,110 @@
+"""tokenizing the lines of a GEDCOM file"""
+
+import re
+
+
+# a legal GEDCOM line is a level, an optional @xref@ and a tag separated by spaces, followed by an optional value.  Lines
+# read as bytes, like the index reads them, may still end in the \r of a Windows \r\n
+GEDCOM_LINE = re.compile(r'[ \t]*\ufeff?(\d+)[ \t]+(?:(@[^@\s]+@)[ \t]+)?(\S+)(?:[ \t]|(?=\r)|$)')
+
+# the same, for the lines of a block of text that may start a level 0 record
+RECORD_LINE = re.compile(r'^[ \t]*\ufeff?(0\d*)[ \t]+(?:@[^@\s]+@[ \t]+)?(\S+)(?:[ \t]|(?=\r)|$)', re.MULTILINE)
+
+
+################
+### CLASSES ####
+################
+
+class GedcomLine(object):
+    """a single line of a GEDCOM file, tokenized once into its level, xref, tag & the offset of its value.  Lines that
+    don't start with a legal level & tag have a level of -1, an empty tag and the whole line as their value"""
+
+    __slots__ = ('text', 'lineno', 'level', 'xref', 'tag', 'valuestart')
+
+    def __init__(self, text, lineno, level=-1, xref="", tag="", valuestart=0):
+        self.text = text
+        self.lineno = lineno
+        self.level = level
+        self.xref = xref
+        self.tag = tag
+        self.valuestart = valuestart
+
+    @property
+    def value(self):
+        """the value of the line without its newline"""
+        return self.text[self.valuestart:].rstrip("\r\n")
+
+
+################
+## FUNCTIONS ###
+################
+
+def parseline(text, lineno):
+    """tokenize a line of a GEDCOM file into a GedcomLine"""
+
+    # the line is legal if it starts with a level and a tag that is either all uppercase or starts with a _ as a custom
+    # tag.  The level may be preceded by a Byte Order Marking on the 1st line of the file
+    match = GEDCOM_LINE.match(text)
+    if match is not None:
+        tag = match.group(3)
+        if tag[0] == "_" or tag.isupper():
+            return GedcomLine(text, lineno, int(match.group(1)), match.group(2) or "", tag, match.end())
+
+    return GedcomLine(text, lineno)
+
+
+def parselines(lines, lineno=1):
+    """tokenize each line of a GEDCOM file, numbering them from lineno"""
+    for text in lines:
+        yield parseline(text, lineno)
+        lineno = lineno + 1
+
+
+def makeline(level, tag, value="", xref="", lineno=0, end="\n"):
+    """build a new GedcomLine from its parts"""
+    text = str(level) + " "
+    if xref != "":
+        text = text + xref + " "
+    text = text + tag
+    valuestart = len(text)
+    if value != "":
+        text = text + " " + value
+        valuestart = valuestart + 1
+    return GedcomLine(text + end, lineno, level, xref, tag, valuestart)
+
+
+def replacevalue(line, value):
+    """return a copy of a legal line with its value replaced, keeping the level, xref & tag exactly as they were"""
+    prefix = line.text[:line.valuestart]
+    if value == "":
+        prefix = prefix.rstrip(" \t")
+    elif not prefix.endswith((" ", "\t")):
+        prefix = prefix + " "
+    return GedcomLine(prefix + value + "\n", line.lineno, line.level, line.xref, line.tag, len(prefix))
+
+
+def makeNOTEline(line, prefix=""):
+    """convert a line into a NOTE line whose text is prefix followed by the words of the original value"""
+
+    # a line without a value keeps its tag as the text of the NOTE so that nothing is lost
+    words = line.value.split() or [line.tag]
+    return makeline(line.level, "NOTE", prefix + " ".join(words), line.xref, line.lineno)
+
+
+def isrecordstart(text):
+    """return True if the line starts a level 0 record"""
+    # only lines starting with a 0 are worth tokenizing
+    if text.lstrip(" \t\ufeff")[:1] != "0":
+        return False
+    return parseline(text, 0).level == 0
+
+
+def findrecordstarts(text, start=0, end=None):
+    """yield the offset of every line of text between start & end that starts a level 0 record, without splitting it
+    into lines.  The lines must end in newlines"""
+    if end is None:
+        end = len(text)
+    for match in RECORD_LINE.finditer(text, start, end):
+        tag = match.group(2)
+        if int(match.group(1)) == 0 and (tag[0] == "_" or tag.isupper()):
+            yield match.start()
@@ -0,0 +1,169 @@
+"""an index of the byte offset & length of every level 0 record of a GEDCOM file, kept in a sidecar file, so single
+records can be scrubbed without reading the whole file"""
+
+import collections
+import io
+import json
+import os
+
+from gedscrub.archive import compression
+from gedscrub.charset import inputencoding
+from gedscrub.gedcom import parseline, parselines
+from gedscrub.pipeline import chainstages
+
+
+# the sidecar is the GEDCOM file's path with this added to it
+INDEX_SUFFIX = ".idx"
+
+# bytes a line may start with before its level: indentation & the UTF-8 byte order mark
+LEADING = b" \t\xef\xbb\xbf"
+
+# a level 0 record: its xref (empty for HEAD & TRLR), its type, where its bytes are in the file and the line number of
+# its 1st line
+IndexedRecord = collections.namedtuple("IndexedRecord", ["xref", "tag", "offset", "length", "lineno"])
+
+
+################
+### CLASSES ####
+################
+
+class RecordIndex(object):
+    """the records of a GEDCOM file, along with the size & modification time the file had when it was indexed so a
+    stale index can be spotted"""
+
+    VERSION = 1
+
+    def __init__(self, size, mtime, records):
+        self.size = size
+        self.mtime = mtime
+        self.records = records
+        self.xrefs = {record.xref: record for record in records if record.xref != ""}
+
+    def isfresh(self, path):
+        """return True if the file at path hasn't changed since it was indexed"""
+        status = os.stat(path)
+        return status.st_size == self.size and status.st_mtime_ns == self.mtime
+
+    def select(self, selectors):
+        """return the records picked by selectors, in the order they are in the file.  A selector is either an xref like
+        @I1234@ or a record type like SOUR"""
+        xrefs = set()
+        tags = set()
+        for selector in selectors:
+            if selector.startswith("@"):
+                if selector not in self.xrefs:
+                    raise ValueError("no record " + selector + " in the index")
+                xrefs.add(selector)
+            else:
+                tags.add(selector.upper())
+        return [record for record in self.records if record.xref in xrefs or record.tag in tags]
+
+    def save(self, indexpath):
+        with open(indexpath, 'w') as indexfile:
+            json.dump({"version": self.VERSION, "size": self.size, "mtime": self.mtime,
+                       "records": [list(record) for record in self.records]}, indexfile, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, indexpath):
+        """read an index sidecar.  Returns None if it is from another version of gedscrub"""
+        with open(indexpath, 'r') as indexfile:
+            index = json.load(indexfile)
+        if index.get("version") != cls.VERSION:
+            return None
+        return cls(index["size"], index["mtime"], [IndexedRecord(*record) for record in index["records"]])
+
+
+################
+## FUNCTIONS ###
+################
+
+def checkencoding(path, encoding=None):
+    """return the codec of a GEDCOM file, or encoding if it's given.  Records are found by the bytes their lines start
+    with, so the file's character set has to keep ASCII as it is.  Their offsets are in the file itself, which can't
+    be compressed"""
+    if compression(path) is not None:
+        raise ValueError("the records of a compressed file like " + path + " can't be indexed")
+    encoding = inputencoding(path, encoding)
+    if encoding.startswith("utf-16"):
+        raise ValueError("the records of a UTF-16 file like " + path + " can't be indexed")
+    return encoding
+
+
+def buildindex(path, encoding=None):
+    """read a GEDCOM file once, noting where each level 0 record starts and ends"""
+    status = os.stat(path)
+    records = []
+    encoding = checkencoding(path, encoding)
+    start = 0
+    startline = 1
+    xref = ""
+    tag = ""
+    offset = 0
+    lineno = 0
+    with open(path, 'rb') as infile:
+        for data in infile:
+            lineno = lineno + 1
+
+            # only lines starting with a 0 are worth decoding & tokenizing, the rest are only counted.  Anything before
+            # the 1st record is kept as a record without a type so the records cover the whole file
+            first = data[:1]
+            if first in LEADING:
+                first = data.lstrip(LEADING)[:1]
+            if first == b"0":
+                line = parseline(data.decode(encoding, errors="replace"), lineno)
+                if line.level == 0:
+                    if offset > start:
+                        records.append(IndexedRecord(xref, tag, start, offset - start, startline))
+                    start = offset
+                    startline = lineno
+                    xref = line.xref
+                    tag = line.tag
+            offset = offset + len(data)
+    if offset > start:
+        records.append(IndexedRecord(xref, tag, start, offset - start, startline))
+    return RecordIndex(status.st_size, status.st_mtime_ns, records)
+
+
+def indexpath(path):
+    """the path of the index sidecar of a GEDCOM file"""
+    return path + INDEX_SUFFIX
+
+
+def openindex(path, sidecar=None, encoding=None):
+    """return the index of a GEDCOM file, from its sidecar if that is up to date, otherwise indexing the file again and
+    saving the new index to the sidecar"""
+    if sidecar is None:
+        sidecar = indexpath(path)
+    if os.path.exists(sidecar):
+        try:
+            index = RecordIndex.load(sidecar)
+        except (ValueError, KeyError, TypeError):
+            index = None
+        if index is not None and index.isfresh(path):
+            return index
+
+    index = buildindex(path, encoding)
+    try:
+        index.save(sidecar)
+    except OSError as e:
+        # the index still works without its sidecar, it just has to be built again next time
+        print("Warning: couldn't save the index " + sidecar + ": " + str(e))
+    return index
+
+
+def iterrecords(path, records, encoding=None):
+    """tokenize the lines of the given records of a GEDCOM file, reading only their bytes & numbering the lines as they
+    are numbered in the whole file"""
+    encoding = checkencoding(path, encoding)
+    with open(path, 'rb') as infile:
+        for record in records:
+            infile.seek(record.offset)
+            # newlines are read the same way as from a file opened in text mode
+            text = infile.read(record.length).decode(encoding)
+            yield from parselines(io.StringIO(text, newline=None), record.lineno)
+
+
+def runrecords(path, outfile, records, stages, meters=None, encoding=None):
+    """scrub only the given records of a GEDCOM file through the stages, writing them to outfile in file order"""
+    lines = chainstages(iterrecords(path, records, encoding), stages, meters)
+    outfile.writelines(line.text for line in lines)
@@ -0,0 +1,401 @@
+"""g1: downloading the media files linked from a GEDCOM file"""
+
+import collections
+import concurrent.futures
+import email.utils
+import functools
+import hashlib
+import http.client
+import itertools
+import json
+import os
+import shutil
+import ssl
+import threading
+from urllib.parse import urljoin, urlparse
+
+from gedscrub.gedcom import parselines
+
+# REFERENCES
+# https://nerok00.github.io/ancestry-image-downloader/
+# http://forums.rootsmagic.com/index.php?/topic/13901-importing-gedcoms-from-ancestrycom/
+
+
+# number of files g1 downloads at once
+MAX_DOWNLOADS = 8
+
+# directory within the g1 download directory that holds each downloaded file once, named by the hash of its contents
+MEDIA_DIR = ".media"
+
+
+################
+### CLASSES ####
+################
+
+class DownloadManifest(object):
+    """record of the files g1 has downloaded, with their size, ETag, Last-Modified date and checksum.  It is kept as a
+    journal in the download directory, one JSON entry per line, so an interrupted or repeated run only transfers what
+    is new"""
+
+    FILENAME = ".gedscrub-downloads.jsonl"
+
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+        self.path = os.path.join(download_dir, self.FILENAME)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        # later entries for a file replace earlier ones.  A line cut short by a crash is ignored
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as journal:
+                for text in journal:
+                    try:
+                        entry = json.loads(text)
+                    except ValueError:
+                        continue
+                    self.entries[entry["path"]] = entry
+
+        # rewrite the journal with only the latest entries so it doesn't grow forever.  The download directory may not
+        # exist yet, as nothing has been downloaded into it
+        os.makedirs(download_dir, exist_ok=True)
+        with open(self.path + ".tmp", 'w') as journal:
+            for entry in self.entries.values():
+                journal.write(json.dumps(entry) + "\n")
+        os.replace(self.path + ".tmp", self.path)
+        self.journal = open(self.path, 'a')
+
+    def key(self, downloadpath):
+        """return the name a downloaded file is recorded under"""
+        return os.path.relpath(downloadpath, self.download_dir)
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def record(self, entry):
+        with self.lock:
+            self.entries[entry["path"]] = dict(entry)
+            self.journal.write(json.dumps(entry) + "\n")
+            self.journal.flush()
+
+    def close(self):
+        self.journal.close()
+
+
+class ConnectionPool(object):
+    """keeps HTTP connections open between requests, so files downloaded from the same host reuse a connection instead
+    of each paying for a new TCP & TLS handshake"""
+
+    def __init__(self, maxsize=MAX_DOWNLOADS, timeout=60):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.idle = collections.defaultdict(list)
+        self.lock = threading.Lock()
+        self.context = ssl.create_default_context()
+
+    def connect(self, key):
+        """return an idle connection to the host, or a new one if there aren't any.  Also returns whether it was idle"""
+        with self.lock:
+            if len(self.idle[key]) > 0:
+                return self.idle[key].pop(), True
+
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self.context), False
+        elif scheme == "http":
+            return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+        raise ValueError("unsupported URL scheme " + scheme)
+
+    def request(self, url, headers=None, redirects=5):
+        """send a GET request for url, following redirects.  The response must be handed back with release()"""
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        path = parsed.path or "/"
+        if parsed.query:
+            path = path + "?" + parsed.query
+        headers = dict(headers or {})
+        headers.setdefault("User-Agent", "gedscrub")
+
+        # the server may have closed a connection while it sat idle, so a request on one is retried on a new connection
+        while True:
+            connection, reused = self.connect(key)
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            break
+        response.poolkey = key
+        response.connection = connection
+
+        if response.status in (301, 302, 303, 307, 308) and response.getheader("Location") and redirects > 0:
+            response.read()
+            self.release(response, True)
+            return self.request(urljoin(url, response.getheader("Location")), headers, redirects - 1)
+        return response
+
+    def release(self, response, complete):
+        """hand back a response.  Its connection is kept for the next request if the whole body was read"""
+        if complete and not response.will_close:
+            with self.lock:
+                if len(self.idle[response.poolkey]) < self.maxsize:
+                    self.idle[response.poolkey].append(response.connection)
+                    return
+        response.connection.close()
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+
+################
+## FUNCTIONS ###
+################
+
+def iterdownloads(file, download_dir):
+    """find the FILEs to download, yielding the URL and the path to download each one to"""
+    # REFERENCES
+    # https://nerok00.github.io/ancestry-image-downloader/
+    # https://www.programcreek.com/python/example/663/urllib.urlretrieve
+
+    firstname = ""
+    lastname = ""
+    i = 1
+
+    # check each line
+    for line in parselines(file):
+
+        # if the tag is NAME save the name for download path
+        if line.tag == "NAME":
+            nametokens = line.value.split('/')
+            if len(nametokens) >= 2:
+                firstname = ''.join(e for e in nametokens[0] if e.isalnum())
+                lastname = ''.join(e for e in nametokens[1] if e.isalnum())
+            i = 1
+
+        # if the level is 2 and the tag is "FILE" then download the file
+        if line.level == 2 and line.tag == "FILE":
+
+            # split the value into its URL parts
+            parsed = urlparse(line.value.strip())
+
+            # grab the file extension
+            _, extension = os.path.splitext(parsed.path)
+
+            # create downloadpath directories if necessary
+            downloadpath = download_dir + lastname + "/" + firstname + "/"
+            if not os.path.isdir(downloadpath):
+                os.makedirs(downloadpath)
+
+            # download files from different sites differently
+            if parsed.hostname == "www.myheritageimages.com":
+                # myheritage.com is pretty nice since they put real image URL's in the GEDCOM
+                yield (parsed.scheme + "://" + parsed.hostname + parsed.path,
+                       downloadpath + firstname + lastname + str(i) + extension)
+            elif parsed.hostname == "trees.ancestry.com":
+                # ancestry.com are assholes and make you jump through a bunch of hoops to find the true download URL
+                print("downloading images from ancestry.com isn't fully supported yet")
+
+            i = i + 1
+
+
+def downloadfile(url, downloadpath, manifest=None, pool=None):
+    """download url to downloadpath, resuming a partial download and skipping a file that hasn't changed since it was
+    downloaded.  Returns True if the file was transferred, False if it was already up to date"""
+    if pool is None:
+        pool = ConnectionPool(1)
+    key = downloadpath
+    entry = None
+    if manifest is not None:
+        key = manifest.key(downloadpath)
+        entry = manifest.get(key)
+        if entry is not None and entry["url"] != url:
+            entry = None
+    partpath = downloadpath + ".part"
+    headers = {}
+    offset = 0
+
+    # ask the server to only send the file if it changed since it was downloaded, or the rest of the file if the
+    # download was interrupted part way through
+    if os.path.isfile(downloadpath) and (entry is None or entry["complete"]):
+        if entry is not None and entry["etag"] is not None:
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry["last_modified"] is not None:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        elif entry is None:
+            headers["If-Modified-Since"] = email.utils.formatdate(os.path.getmtime(downloadpath), usegmt=True)
+    elif entry is not None and os.path.isfile(partpath) and (entry["etag"] or entry["last_modified"]):
+        offset = os.path.getsize(partpath)
+        headers["Range"] = "bytes=" + str(offset) + "-"
+        headers["If-Range"] = entry["etag"] or entry["last_modified"]
+
+    response = pool.request(url, headers)
+    complete = False
+    try:
+        if response.status == 304:
+            response.read()
+            complete = True
+            return False
+        if response.status == 416 and offset > 0:
+            # the partial file is no use, so start again from the beginning
+            response.read()
+            complete = True
+            os.remove(partpath)
+            return downloadfile(url, downloadpath, manifest, pool)
+        if response.status >= 400:
+            raise OSError("HTTP Error " + str(response.status) + ": " + response.reason)
+
+        # the server sends the whole file if it doesn't support ranges or the file changed since the partial download
+        if response.status != 206:
+            offset = 0
+        entry = {"path": key, "url": url, "size": None, "etag": response.getheader("ETag"),
+                 "last_modified": response.getheader("Last-Modified"), "sha256": None, "complete": False}
+        if manifest is not None:
+            manifest.record(entry)
+
+        digest = hashlib.sha256()
+        if offset > 0:
+            with open(partpath, 'rb') as partfile:
+                for chunk in iter(functools.partial(partfile.read, 65536), b''):
+                    digest.update(chunk)
+        with open(partpath, 'ab' if offset > 0 else 'wb') as partfile:
+            for chunk in iter(functools.partial(response.read, 65536), b''):
+                partfile.write(chunk)
+                digest.update(chunk)
+
+        # a connection that drops part way through just ends the file early, so check it's all there.  The partial
+        # file is kept to be resumed by the next run
+        length = response.getheader("Content-Length")
+        if length is not None and os.path.getsize(partpath) != offset + int(length):
+            raise OSError("the download was cut short")
+        complete = True
+    finally:
+        pool.release(response, complete)
+
+    entry["size"] = os.path.getsize(partpath)
+    entry["sha256"] = digest.hexdigest()
+    entry["complete"] = True
+    os.replace(partpath, downloadpath)
+    if manifest is not None:
+        manifest.record(entry)
+    return True
+
+
+def fetchmedia(url, download_dir, extension, manifest=None, pool=None):
+    """download url once into the media store of download_dir.  Returns whether the file was transferred and the path
+    of the stored file, which is named after the hash of its contents"""
+
+    # the download itself is kept under the hash of its URL so later runs can resume it or check it for changes
+    urlpath = os.path.join(download_dir, MEDIA_DIR, "urls", hashlib.sha256(url.encode()).hexdigest() + extension)
+    os.makedirs(os.path.dirname(urlpath), exist_ok=True)
+    transferred = downloadfile(url, urlpath, manifest, pool)
+
+    entry = None
+    if manifest is not None:
+        entry = manifest.get(manifest.key(urlpath))
+    if entry is not None and entry["complete"] and entry["sha256"] is not None:
+        checksum = entry["sha256"]
+    else:
+        digest = hashlib.sha256()
+        with open(urlpath, 'rb') as mediafile:
+            for chunk in iter(functools.partial(mediafile.read, 65536), b''):
+                digest.update(chunk)
+        checksum = digest.hexdigest()
+
+    # the same picture downloaded from different URLs is only stored once
+    storepath = os.path.join(download_dir, MEDIA_DIR, checksum[:2], checksum + extension)
+    if not os.path.exists(storepath):
+        os.makedirs(os.path.dirname(storepath), exist_ok=True)
+        linkfile(urlpath, storepath)
+    return transferred, storepath
+
+
+def linkfile(source, destination):
+    """make destination refer to source with a hard link, or a symbolic link or copy if hard links aren't possible"""
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return
+
+    # link to a temporary name first so an existing file is replaced in one step
+    temppath = destination + ".tmp"
+    if os.path.lexists(temppath):
+        os.remove(temppath)
+    try:
+        os.link(source, temppath)
+    except OSError:
+        try:
+            os.symlink(os.path.relpath(source, os.path.dirname(destination)), temppath)
+        except OSError:
+            shutil.copyfile(source, temppath)
+    os.replace(temppath, destination)
+
+
+def downloadimages(file, download_dir, max_downloads=MAX_DOWNLOADS):
+    """download every FILE, with up to max_downloads downloads in flight at once.  Each URL is downloaded once, stored
+    by the hash of its contents, and linked into the folder of every person it belongs to.  Files downloaded by an
+    earlier run are only transferred again if they changed"""
+    downloaded = 0
+    uptodate = 0
+    failed = 0
+    linked = 0
+    manifest = DownloadManifest(download_dir)
+    pool = ConnectionPool(max_downloads)
+
+    # fetched holds the stored file of every URL that has finished, or None if it failed.  waiting holds the paths to
+    # link each URL that is still downloading to
+    fetched = {}
+    waiting = {}
+
+    # downloads spend most of their time waiting on the network, so they run on a pool of threads.  Only max_downloads
+    # are submitted at a time so the rest of the file is read as the downloads finish
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_downloads) as executor:
+            pending = {}
+            for url, downloadpath in itertools.chain(iterdownloads(file, download_dir), [(None, None)]):
+                if url in fetched:
+                    if fetched[url] is not None:
+                        print("linking:     ", url, "to", downloadpath)
+                        linkfile(fetched[url], downloadpath)
+                        linked = linked + 1
+                elif url in waiting:
+                    waiting[url].append(downloadpath)
+                elif url is not None:
+                    print("downloading: ", url, "to", downloadpath)
+                    _, extension = os.path.splitext(downloadpath)
+                    pending[executor.submit(fetchmedia, url, download_dir, extension, manifest, pool)] = url
+                    waiting[url] = [downloadpath]
+
+                # wait for a download to finish when the pool is full, or for all of them at the end of the file
+                while len(pending) >= max_downloads or (url is None and len(pending) > 0):
+                    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        doneurl = pending.pop(future)
+                        try:
+                            transferred, storepath = future.result()
+                        except (OSError, ValueError, http.client.HTTPException) as e:
+                            print("Error: couldn't download " + doneurl + ": " + str(e))
+                            failed = failed + 1
+                            fetched[doneurl] = None
+                            del waiting[doneurl]
+                            continue
+
+                        if transferred:
+                            downloaded = downloaded + 1
+                        else:
+                            uptodate = uptodate + 1
+                        fetched[doneurl] = storepath
+                        for linkpath in waiting.pop(doneurl):
+                            linkfile(storepath, linkpath)
+                            linked = linked + 1
+    finally:
+        manifest.close()
+        pool.close()
+
+    print("downloaded " + str(downloaded) + " files, " + str(uptodate) + " already up to date, " + str(failed) +
+          " failed, " + str(linked) + " linked into place")
+    return failed
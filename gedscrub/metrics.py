@@ -0,0 +1,193 @@
+"""the --stats metrics of a scrubbing job"""
+
+import itertools
+import json
+import os
+import sys
+import time
+
+from gedscrub.ops import HTML_MEMO
+
+
+################
+### CLASSES ####
+################
+
+class StageMeter(object):
+    """times one stage of the pipeline and counts the lines it yields.  The time includes the stages before it, which
+    RunMetrics subtracts"""
+    __slots__ = ("wall", "cpu", "lines")
+
+    # reading the CPU clock is a system call, so lines are pulled through the stage a block at a time and each block is
+    # timed rather than each line.  The output is the same but the changes are reported a block at a time per stage
+    BLOCK = 1024
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.lines = 0
+
+    def wrap(self, lines):
+        """yield the lines, timing how long they took to arrive"""
+        lines = iter(lines)
+        while True:
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            block = list(itertools.islice(lines, self.BLOCK))
+            self.wall += time.perf_counter() - wall
+            self.cpu += time.process_time() - cpu
+            if len(block) == 0:
+                return
+            self.lines += len(block)
+            yield from block
+
+    def totals(self):
+        return self.wall, self.cpu, self.lines
+
+
+class RunMetrics(object):
+    """the --stats metrics of a job: wall & CPU time, lines in & out and lines changed for each option, and the bytes,
+    throughput and peak memory of the whole run"""
+
+    def __init__(self):
+        self.options = []
+        self.stages = []
+        self.downloads = None
+        self.bytes_read = None
+        self.cache = None
+        self.memo = (0, 0, 0)
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def begin(self):
+        self.wall = time.perf_counter()
+        self.cpu = cputime()
+        self.memo = tuple(-count for count in HTML_MEMO.counts())
+
+    def end(self):
+        self.wall = time.perf_counter() - self.wall
+        self.cpu = cputime() - self.cpu
+        self.addmemo(HTML_MEMO.counts())
+
+    def addmemo(self, counts):
+        """add the hits, misses & evictions of a g6 memo"""
+        if counts is not None:
+            self.memo = tuple(total + count for total, count in zip(self.memo, counts))
+
+    def meters(self, options):
+        """return a meter for the parser and one for each option, in order"""
+        self.options = list(options)
+        self.stages = [StageMeter() for i in range(len(self.options) + 1)]
+        return self.stages
+
+    def add(self, totals, memo=None):
+        """add the totals of the meters, and the g6 memo counts, of a chunk scrubbed by a worker process"""
+        self.addmemo(memo)
+        for meter, (wall, cpu, lines) in zip(self.stages, totals):
+            meter.wall += wall
+            meter.cpu += cpu
+            meter.lines += lines
+
+    def record(self, job, log, workers=None, bytes_read=None, bytes_written=None):
+        """return the metrics as a dict, ready to be written as JSON.  The bytes read & written are the sizes of the
+        input & output files unless they are given, or the job only read some of its records"""
+        ops = []
+        if self.downloads is not None:
+            ops.append({"option": "g1", "wall_seconds": self.downloads[0], "cpu_seconds": self.downloads[1]})
+
+        # each meter includes the stages before it, so the time of an option is the difference from the one before
+        for option, meter, before in zip(self.options, self.stages[1:], self.stages):
+            wall = max(meter.wall - before.wall, 0.0)
+            ops.append({"option": option, "wall_seconds": wall, "cpu_seconds": max(meter.cpu - before.cpu, 0.0),
+                        "lines_in": before.lines, "lines_out": meter.lines, "lines_changed": log.changed[option],
+                        "lines_per_sec": before.lines / wall if wall > 0 else None})
+
+        lines_read = self.stages[0].lines if len(self.stages) > 0 else 0
+        if bytes_read is None:
+            bytes_read = self.bytes_read
+        if bytes_read is None:
+            bytes_read = os.path.getsize(job["input"])
+        lines_written = 0
+        if not job.get("dry_run") and len(self.stages) > 0:
+            if bytes_written is None:
+                bytes_written = os.path.getsize(job["output"])
+            lines_written = self.stages[-1].lines
+        if bytes_written is None:
+            bytes_written = 0
+
+        record = {"input": job.get("input"), "output": job.get("output"),
+                  "options": ([] if self.downloads is None else ["g1"]) + self.options,
+                  "dry_run": bool(job.get("dry_run")), "workers": workers or 1, "wall_seconds": self.wall,
+                  "cpu_seconds": self.cpu, "parse_seconds": self.stages[0].wall if len(self.stages) > 0 else 0.0,
+                  "lines_read": lines_read, "lines_written": lines_written, "bytes_read": bytes_read,
+                  "bytes_written": bytes_written, "lines_changed": sum(log.changed.values()),
+                  "lines_per_sec": lines_read / self.wall if self.wall > 0 else None,
+                  "bytes_per_sec": bytes_read / self.wall if self.wall > 0 else None,
+                  "peak_rss_mb": peakrss(), "ops": ops}
+
+        # with a cache, only the records that weren't in it went through the options, so only they are counted in the
+        # lines read & written
+        if self.cache is not None:
+            record["cache_hits"], record["cache_misses"] = self.cache
+
+        # the memo of g6 is shared by every job a process scrubs, so only the lookups made during this job count
+        if "g6" in self.options:
+            record["memo_hits"], record["memo_misses"], record["memo_evictions"] = self.memo
+        return record
+
+
+################
+## FUNCTIONS ###
+################
+
+def cputime():
+    """CPU time used by this process and the worker processes it has waited for, in seconds"""
+    # resource is only on Unix.  Elsewhere only the CPU time of this process is known
+    try:
+        import resource
+    except ImportError:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+
+
+def peakrss():
+    """peak resident memory of this process and the worker processes it has waited for, in MB.  None where there's no
+    resource module to measure it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # ru_maxrss is in KB on Linux but bytes on macOS.  Worker processes are children, and count too
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+    if sys.platform == "darwin":
+        rss = rss / 1024
+    return rss
+
+
+def metertotals(meters):
+    """the totals of each meter, to send back from a worker process"""
+    if meters is None:
+        return None
+    return [meter.totals() for meter in meters]
+
+
+def memocounts(before, metered=True):
+    """the hits, misses & evictions of the g6 memo since before, to send back from a worker process"""
+    if not metered:
+        return None
+    return tuple(count - start for count, start in zip(HTML_MEMO.counts(), before))
+
+
+def writemetrics(path, records, stdout=None):
+    """write the --stats metrics of each job as a line of JSON to path, or to stdout if it is -.  stdout is standard
+    output unless it's given"""
+    text = "".join(json.dumps(record) + "\n" for record in records)
+    if path == "-":
+        print(text, end='', file=stdout)
+    else:
+        with open(path, 'w') as outfile:
+            outfile.write(text)
@@ -0,0 +1,374 @@
+"""the scrubbing options, each a generator stage that rewrites a stream of GedcomLines"""
+
+import collections
+import html
+import itertools
+import os
+import re
+import threading
+from urllib.parse import urlparse
+
+from gedscrub.gedcom import parseline, makeline, replacevalue, makeNOTEline
+
+# REFERENCES
+# https://stackoverflow.com/questions/9662346/python-code-to-remove-html-tags-from-a-string
+
+
+# HTML tags, HTML tags other than <a> links, <br> tags and the escaped ampersands in front of an escaped character
+HTML_TAG = re.compile(r'<.*?>')
+HTML_TAG_EXCEPT_LINKS = re.compile(r'<(?!\/?a(?=>|\s.*>))\/?.*?>')
+HTML_BR = re.compile(r'<br>|<br />')
+ESCAPED_AMPERSANDS = re.compile(r'&(?:amp;)+')
+
+# number of values g6 remembers the cleaned form of (default for --memo-size)
+MEMO_SIZE = 4096
+
+
+################
+### CLASSES ####
+################
+
+class CleanMemo(object):
+    """the cleaned form of the values g6 has seen most recently.  Exports repeat the same HTML laden source text
+    thousands of times, so each distinct value is only unescaped & stripped once while it stays in the memo.  Once
+    the memo holds size values the least recently used one is evicted for each new value.  A size of 0 turns it off.
+    The threads of the server & of library callers share it, so it's only looked at or changed holding its lock"""
+
+    def __init__(self, size=MEMO_SIZE):
+        self.size = size
+        self.values = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def resize(self, size):
+        """change how many values are remembered, evicting the least recently used ones that no longer fit"""
+        with self.lock:
+            self.size = size
+            while len(self.values) > max(size, 0):
+                self.values.popitem(last=False)
+                self.evictions = self.evictions + 1
+
+    def clean(self, data, link_option):
+        """return the cleaned lines of data, from the memo if it's there"""
+        key = (link_option, data)
+        with self.lock:
+            cleaned = self.values.get(key)
+            if cleaned is not None:
+                self.values.move_to_end(key)
+                self.hits = self.hits + 1
+                return cleaned
+            self.misses = self.misses + 1
+
+        # the value is cleaned without the lock so other threads aren't held up.  Two threads cleaning the same value
+        # at once both clean it, and the 2nd replaces the 1st's identical result
+        cleaned = cleanvalue(data, link_option)
+        with self.lock:
+            if self.size > 0:
+                self.values[key] = cleaned
+                self.values.move_to_end(key)
+                while len(self.values) > self.size:
+                    self.values.popitem(last=False)
+                    self.evictions = self.evictions + 1
+        return cleaned
+
+    def counts(self):
+        with self.lock:
+            return self.hits, self.misses, self.evictions
+
+
+# the memo every g6 stage of this process shares, so a value repeated across the files & jobs a worker scrubs is
+# cleaned once too
+HTML_MEMO = CleanMemo()
+
+
+################
+## FUNCTIONS ###
+################
+
+def setmemosize(size):
+    """resize the g6 memo of this process.  A worker process runs it as its initializer, as the memo of the process
+    that started it isn't copied to it unless it's forked"""
+    HTML_MEMO.resize(size)
+
+
+def cleanhtml(raw_html, link_option):
+    # link_option selects what to do with "<a href" style links.
+    #   1: delete them and lose the links entirely
+    #   2: leave them alone
+    #   3: convert them to non-markup text
+
+    # REFERNCE
+    # https://stackoverflow.com/questions/9662346/python-code-to-remove-html-tags-from-a-string
+    # https://stackoverflow.com/a/44124
+
+    # there's nothing to remove if there isn't a tag
+    if '<' not in raw_html:
+        return raw_html
+
+    if (link_option == '3'):
+        # find the location of all href=" and </a>
+
+
+        # extract hyperlink
+        # copy hyperlink to the end of anchored text
+        # proceed with tag deletion like normal
+        cleanr = HTML_TAG
+    elif (link_option == '2'):
+        cleanr = HTML_TAG_EXCEPT_LINKS
+    else:
+        cleanr = HTML_TAG
+
+    cleantext = cleanr.sub('', raw_html)
+
+    return cleantext
+
+
+def unescapehtml(data):
+    """convert things like &lt; to < in data, including characters that have been escaped several times over like
+    &amp;amp;lt;, giving the same result as calling html.unescape until nothing changes"""
+    if '&' not in data:
+        return data
+
+    # collapse chains of escaped ampersands so that a single pass decodes the entity at the end of them
+    unescaped = html.unescape(ESCAPED_AMPERSANDS.sub('&', data))
+
+    # decoding may still have built a new entity, ie: &#38;lt; becomes &lt;, so try, up to 10 recursive attempts, to
+    # finish the job
+    j = 1
+    while '&' in unescaped and j < 10:
+        again = html.unescape(unescaped)
+        if again == unescaped:
+            break
+        unescaped = again
+        j = j + 1
+
+    return unescaped
+
+
+def iterupdatelinks(lines, parent_dir, log):
+    firstname = ""
+    lastname = ""
+    i = 1
+
+    # check each line
+    for line in lines:
+
+        # if the tag is NAME save the name for download path
+        if line.tag == "NAME":
+            nametokens = line.value.split('/')
+            if len(nametokens) >= 2:
+                firstname = ''.join(e for e in nametokens[0] if e.isalnum())
+                lastname = ''.join(e for e in nametokens[1] if e.isalnum())
+            i = 1
+
+        # if the level is 2 and the tag is "FILE" then update the link, otherwise rewrite the link as is
+        if line.level == 2 and line.tag == "FILE":
+
+            # split the value into its URL parts
+            parsed = urlparse(line.value.strip())
+
+            # grab the file extension
+            _, extension = os.path.splitext(parsed.path)
+
+            # create filepath
+            filepath = parent_dir + lastname + "/" + firstname + "/"
+
+            # update the link
+            updatedline = makeline(line.level, line.tag, filepath + firstname + lastname + str(i) + extension,
+                                   line.xref, line.lineno)
+            log.update("g2", [line], [updatedline])
+            yield updatedline
+            i = i + 1
+        else:
+            yield line
+
+
+def iterdeletecustomtags(lines, log):
+    # check each line
+    for line in lines:
+
+        # if the tag starts with a "_" then don't write the line to the output file.
+        # otherwise write the line to the output file
+        if line.tag.startswith("_"):
+            log.delete("g3", line)
+        else:
+            yield line
+
+
+def iterdeleteUPDtags(lines, log):
+    # check each line
+    for line in lines:
+
+        # if the tag equals "_UPD" then don't write the line to the output file.
+        # otherwise write the line to the output file
+        if line.tag == "_UPD":
+            log.delete("m1", line)
+        else:
+            yield line
+
+
+def iterupdateUPDtoNOTEtags(lines, log):
+    # check each line
+    for line in lines:
+
+        # if the tag equals "_UPD" then update the tag to a NOTE tag and write it to the output file.  Otherwise write
+        # the line to the output file unmodified
+        if line.tag == "_UPD":
+            updatedline = makeNOTEline(line, "Last Updated: ")
+            log.update("m2", [line], [updatedline])
+            yield updatedline
+        else:
+            yield line
+
+
+def iterdeleteAPIDtags(lines, log):
+    # check each line
+    for line in lines:
+
+        # if the tag equals "_APID" then don't write the line to the output file.
+        # otherwise write the line to the output file
+        if line.tag == "_APID":
+            log.delete("a1", line)
+        else:
+            yield line
+
+
+def iterupdateAPIDtoNOTEtags(lines, log):
+    # check each line
+    for line in lines:
+
+        # if the tag equals "_APID" then update the tag to a NOTE tag and write it to the output file.  Otherwise write
+        # the line to the output file unmodified
+        if line.tag == "_APID":
+            updatedline = makeNOTEline(line, "APID: ")
+            log.update("a2", [line], [updatedline])
+            yield updatedline
+        else:
+            yield line
+
+
+def iterupdatecustomtagstoNOTE(lines, log):
+    # check each line
+    for line in lines:
+
+        # if the tag starts with "_" then update the tag to a NOTE tag and write it to the output file.  Otherwise
+        # write the line to the output file unmodified
+        if line.tag.startswith("_"):
+            updatedline = makeNOTEline(line)
+            log.update("g4", [line], [updatedline])
+            yield updatedline
+        else:
+            yield line
+
+
+def itercleanNewLines(lines, log):
+    last_level = -1
+    last_tag = ""
+
+    # check each line
+    for line in lines:
+
+        # if the line doesn't start with a proper level & tag, then it is an illegal new line
+        # and should be converted into a CONT tagged line
+        if line.tag == "":
+            # if last_tag = CONC or CONT then the continue with the current last_level
+            # otherwise our new CONT tags should be 1 level deeper than last_level
+            if last_tag == "CONC" or last_tag == "CONT":
+                updatedline = makeline(last_level, "CONT", line.value, lineno=line.lineno)
+            else:
+                updatedline = makeline(last_level + 1, "CONT", line.value, lineno=line.lineno)
+
+            log.update("g5", [line], [updatedline])
+            yield updatedline
+        else:
+            last_level = line.level
+            last_tag = line.tag
+            yield line
+
+
+def cleanvalue(data, link_option):
+    """convert things like &lt; to < in data, split it into lines at its <br> tags & remove any remaining HTML (<p>,
+    etc) from each line.  Returns the lines as a tuple"""
+    unescaped = unescapehtml(data)
+    return tuple(cleanhtml(substring, link_option) for substring in HTML_BR.split(unescaped))
+
+
+def cleanhtmlgroup(group, link_option, memo=None):
+    """combine a line with the CONC lines and illegal new lines that follow it and return it with HTML removed.  The
+    cleaning of the combined value is looked up in memo, HTML_MEMO by default"""
+    if memo is None:
+        memo = HTML_MEMO
+    head = group[0]
+    outputlines = []
+
+    # pull out the data from the current line and combine the CONC lines with it since escaped characters and HTML
+    # tags may be split between lines.  Illegal new lines are appended with a <br> to get converted later
+    parts = [head.value]
+    for line in group[1:]:
+        if line.tag != "CONC":
+            parts.append("<br>")
+        parts.append(line.value)
+    data = "".join(parts)
+
+    # convert things like &lt; to < in data and check for <br> & <br />.  If found then convert into a new line.  If
+    # the line is illegal and doesn't start with a TAG then maintain the illegal format.   Else if the line is legal
+    # and starts with a TAG then use CONT.  The same value cleans the same way, so it comes from the memo if it's
+    # been seen recently
+    substrings = memo.clean(data, link_option)
+    if head.tag == "":
+        for substring in substrings:
+            outputlines.append(parseline(substring + "\n", head.lineno))
+    else:
+        outputlines.append(replacevalue(head, substrings[0]))
+
+        # if tag = CONC or CONT then the continue with the current level
+        # otherwise our new CONT tags should be 1 level deeper
+        if head.tag == "CONC" or head.tag == "CONT":
+            level = head.level
+        else:
+            level = head.level + 1
+        for substring in substrings[1:]:
+            outputlines.append(makeline(level, "CONT", substring, lineno=head.lineno))
+
+    # keep the last line without a newline if the input didn't have one
+    if not group[-1].text.endswith("\n"):
+        outputlines[-1].text = outputlines[-1].text.rstrip("\n")
+
+    return outputlines
+
+
+def iterdeleteHTML(lines, link_option, log, memo=None):
+    # link_option selects what to do with "<a href" style links.
+    #   1: delete them and lose the links entirely
+    #   2: leave them alone
+    #   3: convert them to non-markup text
+
+    # TODO: do something with <a href> hyperlinks before stripping them?  Ask the user if they want to strip or keep.  Currently < ahref> tags, and their hyperlink addresses, are vaporized
+
+    group = []
+
+    # for each line, attempt to remove HTML.  A line is held back until the next line that isn't a CONC line or an
+    # illegal new line is found, so only the line currently being combined is kept in memory
+    for line in itertools.chain(lines, [None]):
+
+        # if the tag is CONC or "" then the line belongs with the lines before it
+        if line is not None and len(group) > 0 and (line.tag == "CONC" or line.tag == ""):
+            group.append(line)
+            continue
+
+        # a line on its own without any tags or escaped characters is passed straight through
+        if len(group) == 1 and '<' not in group[0].text and '&' not in group[0].text:
+            yield group[0]
+        elif len(group) > 0:
+            outputlines = cleanhtmlgroup(group, link_option, memo)
+
+            # if any HTML was removed, print out a note & save the modified line, otherwise save the line
+            if len(group) > 1 or len(outputlines) > 1 or outputlines[0].text != group[0].text:
+                log.update("g6", group, outputlines)
+                yield from outputlines
+            else:
+                yield group[0]
+
+        group = [line]
@@ -0,0 +1,216 @@
+"""chaining the scrubbing options together and running them over a file, in one pass or in parallel chunks"""
+
+import collections
+import functools
+import os
+
+from gedscrub.changelog import ChangeLog, RecordingLog, StatsLog
+from gedscrub.gedcom import parselines, isrecordstart
+from gedscrub.metrics import RunMetrics, metertotals, memocounts
+from gedscrub.ops import iterupdatelinks, iterdeletecustomtags, iterdeleteUPDtags, iterupdateUPDtoNOTEtags, \
+    iterdeleteAPIDtags, iterupdateAPIDtoNOTEtags, iterupdatecustomtagstoNOTE, itercleanNewLines, iterdeleteHTML, \
+    HTML_MEMO, setmemosize
+
+
+# scrubbing options that rewrite the GEDCOM line by line and may be chained together into a single pipeline
+PIPELINE_OPTIONS = ["g2", "g3", "g4", "g5", "g6", "m1", "m2", "a1", "a2"]
+
+# pipeline options that only look at one level 0 record at a time, so a file can be split into chunks at the records and
+# the chunks scrubbed in parallel.  g2 numbers the FILEs of a NAME across records so it has to see the whole file
+RECORD_OPTIONS = ["g3", "g4", "g5", "g6", "m1", "m2", "a1", "a2"]
+
+# number of lines, rounded up to the next level 0 record, in each chunk of a file scrubbed in parallel
+CHUNK_LINES = 20000
+
+
+################
+### CLASSES ####
+################
+
+class NullFile(object):
+    """an output file that throws away everything written to it, for a dry run"""
+
+    def write(self, text):
+        return len(text)
+
+    def writelines(self, lines):
+        collections.deque(lines, maxlen=0)
+
+
+################
+## FUNCTIONS ###
+################
+
+def buildpipeline(options, link_option='1', parent_dir='', log=None):
+    """return the list of stages implementing the given scrubbing options, in order.  Every change the stages make is
+    reported to log, which prints them by default"""
+    if log is None:
+        log = ChangeLog()
+
+    stages = []
+    for option in options:
+        if option == "g2":
+            stages.append(functools.partial(iterupdatelinks, parent_dir=parent_dir, log=log))
+        elif option == "g3":
+            stages.append(functools.partial(iterdeletecustomtags, log=log))
+        elif option == "g4":
+            stages.append(functools.partial(iterupdatecustomtagstoNOTE, log=log))
+        elif option == "g5":
+            stages.append(functools.partial(itercleanNewLines, log=log))
+        elif option == "g6":
+            stages.append(functools.partial(iterdeleteHTML, link_option=link_option, log=log))
+        elif option == "m1":
+            stages.append(functools.partial(iterdeleteUPDtags, log=log))
+        elif option == "m2":
+            stages.append(functools.partial(iterupdateUPDtoNOTEtags, log=log))
+        elif option == "a1":
+            stages.append(functools.partial(iterdeleteAPIDtags, log=log))
+        elif option == "a2":
+            stages.append(functools.partial(iterupdateAPIDtoNOTEtags, log=log))
+        else:
+            raise ValueError("option " + option + " can't be used in a pipeline")
+    return stages
+
+
+def chainstages(lines, stages, meters=None):
+    """chain the stages together after lines, returning the lines produced by the last stage.  For --stats the lines
+    and the output of each stage are wrapped in a StageMeter"""
+    if meters is not None:
+        lines = meters[0].wrap(lines)
+    for i, stage in enumerate(stages):
+        lines = stage(lines)
+        if meters is not None:
+            lines = meters[i + 1].wrap(lines)
+    return lines
+
+
+def runpipeline(infile, outfile, stages, meters=None):
+    # each line of the input file is tokenized once into a GedcomLine, then each stage is a generator that consumes
+    # the lines produced by the stage before it, so the input file is read once and the output file written once no
+    # matter how many stages are chained together.  Line numbers printed by a stage always refer to the input file
+    lines = chainstages(parselines(infile), stages, meters)
+    outfile.writelines(line.text for line in lines)
+
+
+def iterchunks(infile, chunk_lines=CHUNK_LINES):
+    """split the lines of a GEDCOM file into chunks of about chunk_lines lines that each start at a level 0 record.
+    Yields the line number of the 1st line of each chunk and the lines in it"""
+    lineno = 1
+    chunk = []
+    for text in infile:
+        if len(chunk) >= chunk_lines and isrecordstart(text):
+            yield lineno, chunk
+            lineno = lineno + len(chunk)
+            chunk = []
+        chunk.append(text)
+    if len(chunk) > 0:
+        yield lineno, chunk
+
+
+def scrubchunk(lineno, texts, options, link_option, parent_dir, metered=False):
+    """run the pipeline over a single chunk in a worker process.  Returns the scrubbed text, the changes made and, if
+    metered, the totals of the meters of each stage & the counts of the g6 memo"""
+    log = RecordingLog()
+    stages = buildpipeline(options, link_option=link_option, parent_dir=parent_dir, log=log)
+    meters = RunMetrics().meters(options) if metered else None
+    before = HTML_MEMO.counts()
+    text = "".join(line.text for line in chainstages(parselines(texts, lineno), stages, meters))
+    return text, log.changes, metertotals(meters), memocounts(before, metered)
+
+
+def runsharded(infile, outfile, options, link_option='1', parent_dir='', log=None, workers=None,
+               chunk_lines=CHUNK_LINES, metrics=None):
+    """run the pipeline of the given options over infile with the chunks of the file spread across a pool of worker
+    processes.  The output and the changes reported to log are the same as runpipeline().  The time each option took
+    in every worker is added up in metrics"""
+    if log is None:
+        log = ChangeLog()
+
+    # check the options before starting any workers, and fall back to a single pass for options that span records
+    stages = buildpipeline(options, link_option=link_option, parent_dir=parent_dir, log=log)
+    meters = metrics.meters(options) if metrics is not None else None
+    if not all(option in RECORD_OPTIONS for option in options):
+        runpipeline(infile, outfile, stages, meters)
+        return
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # the process pool is only imported when it is used, which keeps importing gedscrub fast
+    import concurrent.futures
+
+    # chunks are written, and their changes replayed, in the order they were read.  Only a couple of chunks per
+    # worker are read ahead so memory stays bounded.  Each worker has a g6 memo of the same size as this process
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=setmemosize,
+                                                initargs=(HTML_MEMO.size,)) as executor:
+        pending = collections.deque()
+        for lineno, texts in iterchunks(infile, chunk_lines):
+            pending.append(executor.submit(scrubchunk, lineno, texts, options, link_option, parent_dir,
+                                           metrics is not None))
+            if len(pending) >= workers * 2:
+                writechunk(pending.popleft().result(), outfile, log, metrics)
+        while len(pending) > 0:
+            writechunk(pending.popleft().result(), outfile, log, metrics)
+
+
+def writechunk(result, outfile, log, metrics=None):
+    """write a scrubbed chunk and report its changes"""
+    text, changes, totals, memo = result
+    outfile.write(text)
+    RecordingLog.replay(changes, log)
+    if metrics is not None:
+        metrics.add(totals, memo)
+
+
+def countchunk(lineno, texts, options, link_option, parent_dir, metered=False):
+    """dry run the pipeline over a single chunk in a worker process.  Returns only the counts of its changes, which are
+    much cheaper to send back than the scrubbed text and the changes themselves"""
+    log = StatsLog()
+    stages = buildpipeline(options, link_option=link_option, parent_dir=parent_dir, log=log)
+    meters = RunMetrics().meters(options) if metered else None
+    before = HTML_MEMO.counts()
+    collections.deque(chainstages(parselines(texts, lineno), stages, meters), maxlen=0)
+    return log.deleted, log.updated, log.stats, log.changed, metertotals(meters), memocounts(before, metered)
+
+
+def runcounted(infile, options, link_option='1', parent_dir='', log=None, workers=None, chunk_lines=CHUNK_LINES,
+               metrics=None):
+    """dry run the pipeline of the given options over infile with the chunks of the file spread across a pool of
+    worker processes, adding the counts of every chunk to the StatsLog log and the time each option took to metrics"""
+    if log is None:
+        log = StatsLog()
+
+    # check the options before starting any workers, and fall back to a single pass for options that span records
+    stages = buildpipeline(options, link_option=link_option, parent_dir=parent_dir, log=log)
+    meters = metrics.meters(options) if metrics is not None else None
+    if not all(option in RECORD_OPTIONS for option in options):
+        runpipeline(infile, NullFile(), stages, meters)
+        return
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    import concurrent.futures
+
+    # the counts don't depend on the order of the chunks, but only a couple of chunks per worker are read ahead so
+    # memory stays bounded
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=setmemosize,
+                                                initargs=(HTML_MEMO.size,)) as executor:
+        pending = collections.deque()
+        for lineno, texts in iterchunks(infile, chunk_lines):
+            pending.append(executor.submit(countchunk, lineno, texts, options, link_option, parent_dir,
+                                           metrics is not None))
+            if len(pending) >= workers * 2:
+                addcounts(pending.popleft().result(), log, metrics)
+        while len(pending) > 0:
+            addcounts(pending.popleft().result(), log, metrics)
+
+
+def addcounts(result, log, metrics=None):
+    """add the counts of a dry run chunk to log"""
+    deleted, updated, stats, changed, totals, memo = result
+    log.deleted = log.deleted + deleted
+    log.updated = log.updated + updated
+    log.changed.update(changed)
+    log.merge(stats)
+    if metrics is not None:
+        metrics.add(totals, memo)
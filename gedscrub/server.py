@@ -0,0 +1,190 @@
+"""a long running scrub server taking jobs over a Unix domain socket, so each file only costs the scrubbing itself"""
+
+# PROTOCOL
+# Each request & response is a single line of JSON.  A request is a job, with the same keys as a job in a manifest,
+# and either a path to scrub:
+#   {"id": 1, "input": "in.ged", "output": "out.ged", "ops": ["g5", "g6"], "link_option": "1", "overwrite": true}
+# or the GEDCOM itself in "content", in which case the scrubbed GEDCOM comes back in the response's "content":
+#   {"id": 2, "content": "0 HEAD\n...", "ops": ["g3"]}
+# The response has the id of its request, a status of "ok" or "failed", the error, the number of lines deleted &
+# updated, the --stats metrics of the job unless the request has "stats": false, and the seconds it took.  Jobs on a
+# connection run concurrently, so their responses may come back in a different order.  {"command": "ping"} &
+# {"command": "shutdown"} check on & stop the server.
+
+import concurrent.futures
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import threading
+import time
+
+from gedscrub import __version__
+from gedscrub.api import scrub
+from gedscrub.batch import scrubjob
+from gedscrub.changelog import ChangeLog
+from gedscrub.metrics import RunMetrics
+from gedscrub.ops import HTML_MEMO
+
+
+################
+### CLASSES ####
+################
+
+class ScrubServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """accepts connections on a Unix domain socket, a thread for each, and scrubs their jobs on a shared pool of worker
+    processes that stay running between jobs"""
+
+    daemon_threads = True
+
+    def __init__(self, path, workers=None):
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        socketserver.UnixStreamServer.__init__(self, path, ScrubHandler)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        self.executor.shutdown()
+
+
+class ScrubHandler(socketserver.StreamRequestHandler):
+    """reads the jobs of a connection one per line, submitting each to the worker processes as it arrives and writing
+    its response when it finishes"""
+
+    def setup(self):
+        socketserver.StreamRequestHandler.setup(self)
+        self.lock = threading.Lock()
+        self.answered = threading.Condition(self.lock)
+        self.outstanding = 0
+
+    def respond(self, response, job=False):
+        """write a response.  job is True for the response to a job submitted to the workers"""
+        data = (json.dumps(response) + "\n").encode("utf-8")
+        with self.lock:
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except OSError:
+                # the client went away, there's no one left to tell
+                pass
+            if job:
+                self.outstanding = self.outstanding - 1
+                self.answered.notify_all()
+
+    def finished(self, request, future):
+        """write the response of a job when its worker finishes it"""
+        try:
+            response = future.result()
+        except Exception as e:
+            response = {"status": "failed", "error": str(e)}
+        response["id"] = request.get("id")
+        self.respond(response, job=True)
+
+    def handle(self):
+        for data in self.rfile:
+            if data.strip() == b"":
+                continue
+            try:
+                request = json.loads(data)
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+            except ValueError as e:
+                self.respond({"id": None, "status": "failed", "error": "invalid request: " + str(e)})
+                continue
+
+            command = request.get("command")
+            if command == "ping":
+                self.respond({"id": request.get("id"), "status": "ok", "version": __version__})
+            elif command == "shutdown":
+                self.respond({"id": request.get("id"), "status": "ok"})
+                threading.Thread(target=self.server.shutdown).start()
+            elif command is not None:
+                self.respond({"id": request.get("id"), "status": "failed", "error": "unknown command " + str(command)})
+            else:
+                with self.lock:
+                    self.outstanding = self.outstanding + 1
+                future = self.server.executor.submit(servejob, request)
+                future.add_done_callback(lambda future, request=request: self.finished(request, future))
+
+        # the connection stays open until every job on it has answered
+        with self.lock:
+            while self.outstanding > 0:
+                self.answered.wait()
+
+
+################
+## FUNCTIONS ###
+################
+
+def servejob(request):
+    """run a job in a worker process, returning its response"""
+    if "content" not in request:
+        return scrubjob(request, bool(request.get("overwrite")), request.get("stats", True))
+
+    # the GEDCOM came in the request, so it goes back in the response
+    start = time.time()
+    response = {"status": "ok", "error": ""}
+    log = ChangeLog(quiet=True)
+    metrics = RunMetrics() if request.get("stats", True) else None
+    options = request.get("ops") or []
+    if isinstance(options, str):
+        options = options.replace(",", " ").split()
+    try:
+        if request.get("memo_size") is not None:
+            HTML_MEMO.resize(int(request["memo_size"]))
+        outfile = io.StringIO()
+        if metrics is not None:
+            metrics.begin()
+        scrub(io.StringIO(request["content"], newline=None), outfile, options, str(request.get("link_option", "1")),
+              request.get("parent_dir") or '', log, metrics=metrics)
+        response["content"] = outfile.getvalue()
+        if metrics is not None:
+            metrics.end()
+            response["metrics"] = metrics.record(request, log, bytes_read=len(request["content"].encode("utf-8")),
+                                                 bytes_written=len(response["content"].encode("utf-8")))
+    except (OSError, ValueError, TypeError) as e:
+        response["status"] = "failed"
+        response["error"] = str(e)
+    response["deleted"] = log.deleted
+    response["updated"] = log.updated
+    response["seconds"] = time.time() - start
+    return response
+
+
+def serve(path, workers=None):
+    """scrub the jobs sent to the Unix domain socket at path until told to shut down.  Returns the exit status"""
+    # a socket left behind by a server that didn't shut down cleanly is replaced, anything else is left alone
+    if os.path.exists(path):
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            print("Error: " + path + " exists and isn't a socket")
+            return 1
+        os.unlink(path)
+
+    server = ScrubServer(path, workers)
+    os.chmod(path, 0o600)
+
+    # SIGTERM shuts the server down as cleanly as ^C does
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print("gedscrub " + __version__ + " serving on " + path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+    return 0
+
+
+def request(path, job):
+    """send a single job, or command, to the server listening at path and return its response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        with connection.makefile('rwb') as stream:
+            stream.write((json.dumps(job) + "\n").encode("utf-8"))
+            stream.flush()
+            connection.shutdown(socket.SHUT_WR)
+            return json.loads(stream.readline())